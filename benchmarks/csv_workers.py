@@ -0,0 +1,44 @@
+"""
+Measures how fast a single large CSV file is read with different numbers
+of ``workers``.
+
+Usage::
+
+    python benchmarks/csv_workers.py [rows] [max_workers]
+"""
+
+import os
+import os.path
+import sys
+import tempfile
+import time
+
+# run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_dispenser.sources import Source
+
+
+def write_csv(path, rows):
+    with open(path, 'w') as outfile:
+        outfile.write('id,name,amount,note\n')
+        for i in range(rows):
+            outfile.write('%d,name %d,%d.%02d,"a note, with ""quotes""\nover two lines"\n'
+                          % (i, i, i, i % 100))
+
+def rows_per_second(path, workers):
+    start = time.perf_counter()
+    count = sum(1 for row in Source(path, workers=workers, row_type='tuple'))
+    return count / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'benchmark.csv')
+        write_csv(path, rows)
+        print('%d rows, %.1f MB' % (rows, os.path.getsize(path) / 2**20))
+        print('%8s %12s' % ('workers', 'rows/sec'))
+        counts = [None] + [2**i for i in range(max_workers.bit_length())
+                           if 2**i <= max_workers]
+        for workers in counts:
+            print('%8s %12.0f' % (workers or '-', rows_per_second(path, workers)))
@@ -0,0 +1,271 @@
+"""
+Benchmarks reading each supported format with ``Source``, at several
+scales, from synthetic data.  For each format and number of rows, it
+reports the time to the first row, rows per second and peak resident
+memory (each case runs in a fresh process).
+
+Usage::
+
+    python benchmarks/suite.py                         # all formats
+    python benchmarks/suite.py --formats csv json --scales 10000 1000000
+    python benchmarks/suite.py --save baseline.json    # record results
+    python benchmarks/suite.py --compare baseline.json # flag regressions
+
+Generated data is kept in ``--data-dir`` (by default, a directory in the
+system's temporary directory), so later runs need not write it again.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import itertools
+import json
+import os
+import os.path
+import pickle
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not on Windows; peak memory will not be reported
+
+# run from a checkout, without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_dispenser.sources import Source, sqlalchemy_table_sources
+
+fields = ('id', 'name', 'amount', 'day', 'flag')
+glob_files = 10
+
+
+def synthetic_rows(rows):
+    "Yields ``rows`` tuples of an int, str, float, date string and bool"
+    start = datetime.date(2000, 1, 1)
+    for i in range(rows):
+        yield (i, 'name %d' % i, i * 1.25,
+               (start + datetime.timedelta(days=i % 9000)).isoformat(),
+               i % 3 == 0)
+
+def dicts(rows):
+    return (dict(zip(fields, row)) for row in synthetic_rows(rows))
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(fields)
+        writer.writerows(synthetic_rows(rows))
+
+def write_json(path, rows):
+    with open(path, 'w') as outfile:
+        json.dump(list(dicts(rows)), outfile)
+
+def write_ndjson(path, rows):
+    with open(path, 'w') as outfile:
+        for row in dicts(rows):
+            outfile.write(json.dumps(row) + '\n')
+
+def write_yaml(path, rows):
+    import yaml
+    Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    with open(path, 'w') as outfile:
+        yaml.dump(list(dicts(rows)), outfile, Dumper=Dumper)
+
+def write_xml(path, rows):
+    with open(path, 'w') as outfile:
+        outfile.write('<rows>\n')
+        for row in synthetic_rows(rows):
+            outfile.write('<row>%s</row>\n' % ''.join(
+                '<%s>%s</%s>' % (field, value, field)
+                for (field, value) in zip(fields, row)))
+        outfile.write('</rows>\n')
+
+def write_html(path, rows):
+    with open(path, 'w') as outfile:
+        outfile.write('<html><body><table>\n<thead><tr>%s</tr></thead>\n<tbody>\n'
+                      % ''.join('<th>%s</th>' % field for field in fields))
+        for row in synthetic_rows(rows):
+            outfile.write('<tr>%s</tr>\n' % ''.join('<td>%s</td>' % value
+                                                   for value in row))
+        outfile.write('</tbody></table></body></html>\n')
+
+def write_pickle(path, rows):
+    with open(path, 'wb') as outfile:
+        pickle.dump(list(dicts(rows)), outfile)
+
+def write_xls(path, rows):
+    import xlwt
+    if rows > 65535:
+        raise ValueError('.xls holds at most 65536 rows')
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet('data')
+    for (col_n, field) in enumerate(fields):
+        sheet.write(0, col_n, field)
+    for (row_n, row) in enumerate(synthetic_rows(rows), start=1):
+        for (col_n, value) in enumerate(row):
+            sheet.write(row_n, col_n, value)
+    workbook.save(path)
+
+def write_xlsx(path, rows):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('data')
+    sheet.append(fields)
+    for row in synthetic_rows(rows):
+        sheet.append(row)
+    workbook.save(path)
+
+def write_sqlite(path, rows):
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE data (id INTEGER, name TEXT, '
+                       'amount REAL, day TEXT, flag BOOLEAN)')
+    connection.executemany('INSERT INTO data VALUES (?, ?, ?, ?, ?)',
+                           synthetic_rows(rows))
+    connection.commit()
+    connection.close()
+
+def write_glob(path, rows):
+    "Writes ``rows`` split between ``glob_files`` CSV files in directory ``path``"
+    os.mkdir(path)
+    all_rows = synthetic_rows(rows)
+    for file_n in range(glob_files):
+        with open(os.path.join(path, 'part%d.csv' % file_n), 'w', newline='') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(fields)
+            writer.writerows(itertools.islice(all_rows, -(-rows // glob_files)))
+
+# format: (file extension, writer, function reading the file)
+formats = {
+    'csv': ('.csv', write_csv, Source),
+    'json': ('.json', write_json, Source),
+    'ndjson': ('.ndjson', write_ndjson, Source),
+    'yaml': ('.yaml', write_yaml, Source),
+    'xml': ('.xml', write_xml, Source),
+    'html': ('.html', write_html, Source),
+    'pickle': ('.pickle', write_pickle, Source),
+    'xls': ('.xls', write_xls, Source),
+    'xlsx': ('.xlsx', write_xlsx, Source),
+    'sqlite': ('.sqlite', write_sqlite,
+               lambda path: next(sqlalchemy_table_sources('sqlite:///%s' % path))),
+    'glob': ('', write_glob, lambda path: Source(os.path.join(path, '*.csv'))),
+}
+
+def data_file(data_dir, fmt, rows):
+    "Path to ``rows`` rows of ``fmt`` data, written if not there yet"
+    (ext, writer, reader) = formats[fmt]
+    path = os.path.join(data_dir, '%s_%d%s' % (fmt, rows, ext))
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        if os.path.isdir(partial):  # left by an interrupted run
+            shutil.rmtree(partial)
+        elif os.path.exists(partial):
+            os.remove(partial)
+        writer(partial, rows)
+        os.rename(partial, path)
+    return path
+
+def peak_rss_mb():
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / 2**20  # bytes
+    return peak / 2**10  # kilobytes
+
+def measure(fmt, path):
+    "Reads ``path`` completely; run in a fresh process for each case"
+    reader = formats[fmt][2]
+    start = time.perf_counter()
+    rows = iter(reader(path))
+    next(rows)
+    first_row = time.perf_counter() - start
+    count = 1 + sum(1 for row in rows)
+    elapsed = time.perf_counter() - start
+    return {'rows': count,
+            'first_row_s': first_row,
+            'rows_per_s': count / elapsed,
+            'peak_rss_mb': peak_rss_mb()}
+
+def run(fmts, scales, data_dir):
+    results = {}
+    for rows in scales:
+        for fmt in fmts:
+            case = '%s/%d' % (fmt, rows)
+            try:
+                path = data_file(data_dir, fmt, rows)
+            except (ImportError, ValueError) as e:
+                print('%-16s skipped: %s' % (case, e))
+                continue
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(measure, fmt, path).result()
+            if result['rows'] != rows:
+                raise AssertionError('%s: read %d rows' % (case, result['rows']))
+            results[case] = result
+            print('%-16s %10.4f s to first row %12.0f rows/s %10s MB peak'
+                  % (case, result['first_row_s'], result['rows_per_s'],
+                     '%.1f' % result['peak_rss_mb']
+                     if result['peak_rss_mb'] is not None else '-'))
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Prints how each result compares with the same case in ``baseline``;
+    returns the cases slower, later to the first row, or bigger by more
+    than ``tolerance`` (a fraction).
+    """
+    regressions = []
+    for (case, result) in sorted(results.items()):
+        base = baseline.get(case)
+        if not base:
+            continue
+        speed = result['rows_per_s'] / base['rows_per_s']
+        first_row = result['first_row_s'] / base['first_row_s']
+        worse = []
+        if speed < 1 - tolerance:
+            worse.append('rows/s')
+        # ignore first-row differences of a few milliseconds; they are noise
+        if result['first_row_s'] > base['first_row_s'] * (1 + tolerance) + 0.01:
+            worse.append('first row')
+        rss = '-'
+        if result['peak_rss_mb'] and base['peak_rss_mb']:
+            rss = result['peak_rss_mb'] / base['peak_rss_mb']
+            if rss > 1 + tolerance:
+                worse.append('peak RSS')
+            rss = 'x%.2f' % rss
+        print('%-16s rows/s x%.2f  first row x%.2f  peak RSS %s%s'
+              % (case, speed, first_row, rss,
+                 '  REGRESSION: %s' % ', '.join(worse) if worse else ''))
+        if worse:
+            regressions.append(case)
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--formats', nargs='+', choices=sorted(formats),
+                        default=sorted(formats))
+    parser.add_argument('--scales', nargs='+', type=int, default=[10000, 100000])
+    parser.add_argument('--data-dir', default=os.path.join(
+        tempfile.gettempdir(), 'data_dispenser_benchmarks'))
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='compare results with this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='fraction by which a result may be worse '
+                             'than the baseline (default 0.2)')
+    args = parser.parse_args()
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = run(args.formats, args.scales, args.data_dir)
+    if args.save:
+        with open(args.save, 'w') as outfile:
+            json.dump({'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'results': results}, outfile, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)['results']
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
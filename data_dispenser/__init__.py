@@ -1,7 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from data_dispenser.sources import Source, sqlalchemy_table_sources
+import importlib
+
+from data_dispenser.sources import (Source, SourceStats, Schema,
+                                    sqlalchemy_table_sources)
+
+
+def __getattr__(name):
+    # asyncio is slow to import; only load it for those who want it
+    if name in ('AsyncSource', 'async_sources'):
+        module = importlib.import_module('data_dispenser.async_sources')
+        # importing the submodule bound its name here; rebind the function
+        globals().update(AsyncSource=module.AsyncSource,
+                         async_sources=module.async_sources)
+        return globals()[name]
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
 
 __author__ = 'Catherine Devlin'
 __email__ = 'catherine.devlin@gmail.com'
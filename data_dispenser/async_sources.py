@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Exposes ``AsyncSource``, which reads anything ``Source`` can
+with ``async for``, and ``async_sources``, which reads many
+sources at once.
+"""
+from collections import deque
+import asyncio
+import functools
+import itertools
+import threading
+
+from data_dispenser.sources import Source
+
+
+class AsyncSource(object):
+    """
+    Asynchronous counterpart of ``Source``, taking the same arguments.
+
+    Usage::
+
+        async for row in AsyncSource('http://example.com/data.csv'):
+            print(row)
+
+    Opening the source and reading its rows - network requests, queries
+    and parsing, using the same deserializers as ``Source`` - happen in
+    ``executor`` (by default, the event loop's thread pool), ``batch_size``
+    rows at a time, so the event loop is never blocked.
+    """
+
+    def __init__(self, src, executor=None, batch_size=1000, **kwargs):
+        self.src = src
+        self.executor = executor
+        self.batch_size = batch_size
+        self.kwargs = kwargs
+        self.source = None
+        self._rows = deque()
+        self._exhausted = False
+        self._lock = threading.Lock()  # reads and close, in executor threads
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs))
+
+    async def open(self):
+        "Opens the underlying ``Source``, if not yet open, and returns it"
+        if self.source is None:
+            self.source = await self._run(Source, self.src, **self.kwargs)
+        return self.source
+
+    def _read_batch(self):
+        with self._lock:
+            return list(itertools.islice(self.source, self.batch_size))
+
+    def _close(self):
+        with self._lock:  # after any batch still being read
+            self.source.close()
+
+    async def next_rows(self):
+        "Returns a list of up to ``batch_size`` rows; empty at the end"
+        if self._rows:
+            rows = list(self._rows)
+            self._rows.clear()
+            return rows
+        if self._exhausted:
+            return []
+        await self.open()
+        rows = await self._run(self._read_batch)
+        if len(rows) < self.batch_size:
+            self._exhausted = True
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._rows:
+            self._rows.extend(await self.next_rows())
+            if not self._rows:
+                raise StopAsyncIteration
+        return self._rows.popleft()
+
+    async def aclose(self):
+        "Stops reading, closing the underlying ``Source``"
+        self._exhausted = True
+        self._rows.clear()
+        if self.source is not None:
+            await self._run(self._close)
+
+    @property
+    def table_name(self):
+        return self.source and self.source.table_name
+
+
+async def async_sources(srcs, concurrency=8, executor=None, **kwargs):
+    """
+    Reads up to ``concurrency`` of ``srcs`` at once, yielding
+    ``(src, row)`` for each row as it arrives.  Each source's rows
+    come in order, but rows of different sources are interleaved.
+    Other arguments are passed to each ``AsyncSource``.
+
+    Usage::
+
+        async for (url, row) in async_sources(urls, concurrency=20):
+            print(url, row)
+    """
+    srcs = list(srcs)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    semaphore = asyncio.Semaphore(concurrency)
+    finished = object()
+
+    async def read(src):
+        source = AsyncSource(src, executor=executor, **kwargs)
+        try:
+            async with semaphore:
+                while True:
+                    rows = await source.next_rows()
+                    if not rows:
+                        break
+                    await queue.put((src, rows))
+            await queue.put((src, finished))
+        except Exception as e:
+            await queue.put((src, e))
+        finally:
+            await source.aclose()
+
+    tasks = [asyncio.ensure_future(read(src)) for src in srcs]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            (src, rows) = await queue.get()
+            if rows is finished:
+                remaining -= 1
+            elif isinstance(rows, Exception):
+                raise rows
+            else:
+                for row in rows:
+                    yield (src, row)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
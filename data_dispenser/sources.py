@@ -5,238 +5,2265 @@ Exposes ``Source``, a class which, when instantiated with
 a source of row-like data, acts as a generator returning
 OrderedDicts for each row.
 """
-from collections import OrderedDict
+from collections import OrderedDict, deque, namedtuple
 from io import StringIO, BytesIO
+import base64
+import bz2
+import concurrent.futures
 import csv
-import doctest
+import datetime
+import decimal
+import functools
 import glob
+import gzip
+import hashlib
+import importlib
+import html.parser
+import io
 import itertools
 import json
+import locale
 import logging
+import lzma
+import mmap
+import operator
 import os.path
 import pickle
 import pprint
+import queue
+import random
 import re
 import sys
+import tempfile
+import threading
+import time
 import urllib.parse
 import xml.etree.ElementTree as et
-try:
-    import yaml
-except ImportError:
-    logging.info("Could not import ``pyyaml``; is it installed?``")
-    yaml = None
-try:
-    from pymongo.collection import Collection as MongoCollection
-except ImportError:
-    logging.info("Could not import Collection from pymongo; is it installed?")
-    MongoCollection = None.__class__
-try:
-    import requests
-except ImportError:
-    logging.info("Could not import ``requests``, will not load from URLs")
-    requests = None
-try:
-    import xlrd
-except ImportError:
-    logging.info("Could not import ``xlrd``, will not load from .xls")
-    xlrd = None
-try:
-    import bs4
-except ImportError:
-    logging.info("Could not import ``bs4 (beautifulsoup)``, will not load from HTML")
-    bs4 = None
-try:
-    import sqlalchemy
-except ImportError:
-    logging.info("Could not import ``sqlalchemy``, will not load from relational databases")
-    sqlalchemy = None
-
-
-if yaml:
-    def ordered_yaml_load(stream, Loader=yaml.Loader,
-                          object_pairs_hook=OrderedDict, *args, **kwargs):
+import zipfile
+
+class _OptionalModule(object):
+    """
+    Stands for an optional dependency, which is only imported once one of
+    its attributes is wanted, so that importing this module stays quick.
+    It is false if the dependency cannot be imported.
+    """
+
+    def __init__(self, name, consequence):
+        self._name = name
+        self._consequence = consequence
+        self._module = None
+        self._missing = False
+
+    def _load(self):
+        if self._module is None and not self._missing:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError:
+                logging.info("Could not import ``%s``, %s"
+                             % (self._name, self._consequence))
+                self._missing = True
+        return self._module
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __getattr__(self, attr):
+        module = self._load()
+        if module is None:
+            if attr.startswith('__'):  # probed by hasattr, as by doctest
+                raise AttributeError(attr)
+            raise ImportError('must ``pip install %s``' % self._name)
+        return getattr(module, attr)
+
+yaml = _OptionalModule('yaml', 'will not load YAML')
+requests = _OptionalModule('requests', 'will not load from URLs')
+xlrd = _OptionalModule('xlrd', 'will not load from .xls')
+openpyxl = _OptionalModule('openpyxl', 'will not load from .xlsx')
+bs4 = _OptionalModule('bs4', 'will not select HTML tables by complex CSS selectors')
+sqlalchemy = _OptionalModule('sqlalchemy', 'will not load from relational databases')
+numpy = _OptionalModule('numpy', 'columns will be lists')
+charset_normalizer = _OptionalModule('charset_normalizer',
+                                     "will guess web pages' encodings by chardet")
+chardet = _OptionalModule('chardet', 'will take web pages of unknown encoding as UTF-8')
+
+def _instance_of_loaded(obj, module_name, class_path):
+    """
+    Whether ``obj`` is an instance of the class at ``class_path`` in
+    ``module_name`` - which is only checked if the module has already
+    been imported, as it must have been to create such an object.
+    """
+    cls = sys.modules.get(module_name)
+    for attr in class_path.split('.'):
+        cls = getattr(cls, attr, None)
+    return cls is not None and isinstance(obj, cls)
+
+
+@functools.lru_cache()
+def _ordered_loader(Loader, object_pairs_hook):
+    """
+    Builds, once for each ``Loader``, a subclass constructing mappings
+    with ``object_pairs_hook``, and with a ``Composer`` - which libyaml's
+    loaders lack - to compose a document one node at a time.
+    """
+    class OrderedLoader(Loader, yaml.composer.Composer):
+        def __init__(self, stream):
+            super().__init__(stream)
+            self.anchors = {}
+    OrderedLoader.add_constructor(
+        yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+        lambda loader, node: object_pairs_hook(loader.construct_pairs(node)))
+    return OrderedLoader
+
+def ordered_yaml_load(stream, Loader=None, object_pairs_hook=OrderedDict,
+                      *args, **kwargs):
+    """
+    Preserves order with OrderedDict as yaml is loaded, using libyaml
+    (by default, if available).  Each item of a top-level list is a row,
+    as is each document of a multi-document stream that is not a list.
+    Thanks to coldfix
+    http://stackoverflow.com/questions/5121931/in-python-how-can-you-load-yaml-mappings-as-ordereddicts
+    """
+    if not yaml:
+        raise ImportError('pyyaml not installed')
+    if Loader is None:
+        Loader = getattr(yaml, 'CLoader', None) or yaml.Loader
+    loader = _ordered_loader(Loader, object_pairs_hook)(stream)
+    try:
+        loader.get_event()  # stream start
+        while loader.check_event(yaml.DocumentStartEvent):
+            loader.get_event()
+            if loader.check_event(yaml.SequenceStartEvent):
+                # compose and construct one item of a top-level list
+                # at a time, so that reading can stop at any row
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield loader.construct_document(loader.compose_node(None, None))
+                loader.get_event()
+            else:
+                node = loader.compose_node(None, None)
+                yield from _ensure_rows(loader.construct_document(node))
+            loader.get_event()  # document end
+            loader.anchors = {}
+    finally:
+        loader.dispose()
+
+def _element_to_odict(element):
+    """Given an ElementTree element, return a version of it
+    expressed in OrderedDictionaries."""
+    result = OrderedDict()
+    #if hasattr(element, 'tag') and element.tag:
+    result['tag'] = element.tag
+    for (k, v) in element.items():
+        result[k] = v
+    for child in element:
+        c = _element_to_odict(child)
+        if child.tag in result:
+            if isinstance(result[child.tag], list):
+                result[child.tag].append(c)
+            else:
+                result[child.tag] = [result[child.tag], c]
+        else:
+            result[child.tag] = c
+    if hasattr(element, 'text') and hasattr(element.text, 'strip'):
+        text = element.text.strip()
+        if text:
+            if len(result) == 1: # just 'tag'
+                return text
+            result['text'] = text
+    return result
+
+def _first_list_in(element):
+    """Often the meaningful part of an XML doc is nested inside
+    one or more levels of elements that serve no purpose.
+    This function strips a data tree down to the first list
+    of actual data."""
+    if isinstance(element, list):
+        return element
+    if not hasattr(element, 'items'):
+        return None
+    for (k, v) in element.items():
+        if isinstance(v, list):
+            return v
+    for (k, v) in element.items():
+        child_list_found = _first_list_in(v)
+        if child_list_found:
+            return child_list_found
+
+def _ensure_rows(result):
+    """data_dispenser is for rowlike sources.  If the data source
+       evaluates to a single dict instead of a listlike object,
+       transform a dict of dicts into a list of dicts, or
+       return a list (that contains the dict as its sole row).
+       >>> pprint.pprint(_ensure_rows({"a": 1, "b": 2}))
+       [{'a': 1, 'b': 2}]
+       >>> pprint.pprint(_ensure_rows({"a": {"a1": 1, "a2": 2}, "b": {"b1": 1, "b2": 2}}))
+       [{'a1': 1, 'a2': 2, 'name_': 'a'}, {'b1': 1, 'b2': 2, 'name_': 'b'}]
+
+       otherwise just don't mess with it
+       >>> pprint.pprint(_ensure_rows([{"a1": 1, "a2": 2}, {"b1": 1, "b2": 2}]))
+       [{'a1': 1, 'a2': 2}, {'b1': 1, 'b2': 2}]
+    """
+    if isinstance(result, dict):
+        if not result:
+            result = []
+        # if it's a dict of dicts, convert to a list of dicts
+        if not [s for s in result.values() if not hasattr(s, 'keys')]:
+            result = [dict(name_=k, **result[k]) for k in result]
+        else:
+            result = [result, ]
+    return result
+
+class ParseException(Exception):
+    pass
+
+class TupleRow(tuple):
+    """
+    A row kept as a tuple of values; its field names are held once,
+    by its class, for all rows of the same fields.
+
+    Iterating gives values, like a tuple, but ``row['name']``, ``in``,
+    ``keys()``, ``values()``, ``items()`` and ``get()`` work as for
+    an OrderedDict.
+    """
+    __slots__ = ()
+    _keys = ()
+    _index = {}
+
+    def __new__(cls, values):
+        return tuple.__new__(cls, values)
+
+    def __getitem__(self, key):
+        try:
+            return tuple.__getitem__(self, self._index[key])
+        except (KeyError, TypeError):
+            if isinstance(key, (int, slice)):
+                return tuple.__getitem__(self, key)
+            raise KeyError(key)
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._keys, self)
+
+    def get(self, key, default=None):
+        if key in self._index:
+            return tuple.__getitem__(self, self._index[key])
+        return default
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def _asdict(self):
+        return OrderedDict(zip(self._keys, self))
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+class SlotsRow(object):
+    """
+    A mutable row kept in ``__slots__``; its field names are held
+    once, by its class.  Behaves as an OrderedDict whose keys are fixed.
+    """
+    __slots__ = ()
+    _keys = ()
+    _index = {}
+    _slot_names = ()
+
+    def __init__(self, values):
+        for (slot_name, value) in zip(self._slot_names, values):
+            setattr(self, slot_name, value)
+
+    def __getitem__(self, key):
+        return getattr(self, self._slot_names[self._index[key]])
+
+    def __setitem__(self, key, value):
+        setattr(self, self._slot_names[self._index[key]], value)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __eq__(self, other):
+        return hasattr(other, 'items') and list(self.items()) == list(other.items())
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return tuple(getattr(self, s) for s in self._slot_names)
+
+    def items(self):
+        return zip(self._keys, self.values())
+
+    def get(self, key, default=None):
+        if key in self._index:
+            return self[key]
+        return default
+
+    def _asdict(self):
+        return OrderedDict(self.items())
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.items()))
+
+_row_classes = {}
+_row_classes_lock = threading.Lock()
+
+def row_class(row_type, keys):
+    """
+    Returns the class (creating it only once) for rows of ``row_type``
+    - 'tuple', 'namedtuple', 'slots', or 'dict' / None for OrderedDict -
+    having the field names ``keys``.
+    """
+    if row_type in (None, 'dict'):
+        return OrderedDict
+    try:
+        return _row_classes[(row_type, keys)]
+    except KeyError:
+        pass
+    with _row_classes_lock:  # so that every thread gets the same class
+        if (row_type, keys) not in _row_classes:
+            _row_classes[(row_type, keys)] = _new_row_class(row_type, keys)
+        return _row_classes[(row_type, keys)]
+
+def _new_row_class(row_type, keys):
+    attributes = {'__slots__': (), '_keys': keys,
+                  '_index': dict((k, i) for (i, k) in enumerate(keys))}
+    if row_type == 'tuple':
+        cls = type('Row', (TupleRow, ), attributes)
+    elif row_type == 'namedtuple':
+        named = namedtuple('Row', [str(k) for k in keys], rename=True)
+        cls = type('Row', (TupleRow, named), attributes)
+    elif row_type == 'slots':
+        attributes['_slot_names'] = tuple('_%d' % i for i in range(len(keys)))
+        attributes['__slots__'] = attributes['_slot_names']
+        cls = type('Row', (SlotsRow, ), attributes)
+    else:
+        raise ValueError('Unknown row_type %s' % row_type)
+    return cls
+
+class _RowReader(object):
+    """
+    Iterates over rows as OrderedDicts, but can also deliver them
+    in batches of value tuples sharing a single header, without
+    building a dict per row.
+
+    Subclasses define ``_tuples``, a generator of value tuples which
+    sets ``self.header`` before producing the first.
+    """
+
+    def __init__(self):
+        self.header = None
+        self.row_type = None
+        self._row_class = None
+        self._values = None
+        self._pending = []
+
+    def _value_tuples(self):
+        if self._values is None:
+            self._values = self._tuples()
+        return self._values
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pending:
+            values = self._pending.pop()
+        else:
+            values = self._value_tuples().__next__()
+        return self._make_row(values)
+
+    def _make_row(self, values):
+        if not self.row_type:
+            return OrderedDict(zip(self.header, values))
+        if self._row_class is None:
+            self._row_class = row_class(self.row_type, self.header)
+        return self._row_class(values)
+
+    def unread(self, row):
+        "Pushes a row back, to be produced again next"
+        self._pending.append(tuple(row.values()))
+
+    def close(self):
+        if self._values is not None:
+            self._values.close()
+
+    def batches(self, size):
+        "Yields (header, list of up to ``size`` value tuples)"
+        values = self._value_tuples()
+        while True:
+            batch = self._pending[::-1]
+            self._pending = []
+            batch.extend(itertools.islice(values, size - len(batch)))
+            if not batch:
+                return
+            yield (self.header, batch)
+
+class _CSVReader(_RowReader):
+
+    def __init__(self, target, fieldnames=None):
+        super().__init__()
+        self.target = target
+        self.fieldnames = fieldnames
+
+    def _tuples(self):
+        fieldnames = _interpret_fieldnames(self.target, self.fieldnames)
+        reader = csv.reader(self.target)
+        if fieldnames is None:
+            fieldnames = next(reader, None)
+            if fieldnames is None:  # empty file
+                self.header = ()
+                return
+        self.header = tuple(fieldnames)
+        rows = _fit_rows(reader, len(self.header))
+        if not hasattr(self.target, 'anchor'):
+            yield from rows
+            return
+        # csv.reader reads no further than the row it returns, so the
+        # offset after a row is where the next begins
+        (anchor, every) = (self.target.anchor, self.target.anchor_every)
+        anchor(0)
+        for (count, row) in enumerate(rows, start=1):
+            yield row
+            if not count % every:
+                anchor(count)
+
+def _fit_rows(rows, width):
+    "Yields each non-empty row as a tuple of ``width`` values, padded with None"
+    padding = (None, ) * width
+    for row in rows:
+        if not row:
+            continue
+        if len(row) == width:
+            yield tuple(row)
+        else:
+            yield tuple(row[:width]) + padding[len(row):]
+
+def _newline(data, start=0):
+    "The byte ending lines of ``data``: ``\\n``, or ``\\r`` if it has no ``\\n``"
+    if data.find(b'\n', start) == -1 and data.find(b'\r', start) != -1:
+        return b'\r'
+    return b'\n'
+
+def _csv_chunks(data, start=0, chunk_bytes=0, quoted=True):
+    """
+    Yields (start, end) byte ranges covering ``data`` from ``start``, each
+    at least ``chunk_bytes`` long (where there is that much data) and ending
+    after a record - at a newline with an even number of quotes before it
+    in the range, so never within a quoted field.  Unless ``quoted``,
+    every newline ends a record, as in newline-delimited JSON.
+
+    >>> data = b'a,b\\n"1\\n2",3\\n4,5\\n'
+    >>> [data[start:end] for (start, end) in _csv_chunks(data)]
+    [b'a,b\\n', b'"1\\n2",3\\n', b'4,5\\n']
+    >>> data = b'a,b\\r1,2\\r'
+    >>> [data[start:end] for (start, end) in _csv_chunks(data)]
+    [b'a,b\\r', b'1,2\\r']
+    """
+    size = len(data)
+    eol = _newline(data, start)
+    while start < size:
+        end = min(start + chunk_bytes, size)
+        quotes = data[start:end].count(b'"') if quoted else 0
+        while end < size:
+            newline = data.find(eol, end)
+            if newline == -1:
+                end = size
+                break
+            if quoted:
+                quotes += data[end:newline].count(b'"')
+            end = newline + 1
+            if quotes % 2 == 0:
+                break
+        yield (start, end)
+        start = end
+
+def _csv_header(data, fieldnames=None):
+    """
+    Returns the field names of CSV ``data`` (bytes), found as by
+    ``_interpret_fieldnames``, and the offset of its first data record.
+    """
+    if fieldnames is None:
+        records = 1
+    else:
+        try:
+            records = int(fieldnames) or 1
+        except (ValueError, TypeError):
+            records = 0
+    start = 0
+    for (_, start) in itertools.islice(_csv_chunks(data), records):
+        pass
+    header = io.TextIOWrapper(BytesIO(data[:start]))
+    fieldnames = _interpret_fieldnames(header, fieldnames)
+    if fieldnames is None:
+        fieldnames = next(csv.reader(header), ())
+    return (tuple(fieldnames), start)
+
+def _shard_files(filenames, shard):
+    """
+    Those of ``filenames`` read by shard ``k`` of ``n``.  Largest first,
+    each file goes to the shard with the fewest bytes so far, so that
+    shards get about the same amount of data.
+    """
+    (k, n) = shard
+    totals = [0] * n
+    chosen = []
+    for (size, filename) in sorted((-os.path.getsize(f), f) for f in filenames):
+        least = totals.index(min(totals))
+        totals[least] -= size
+        if least == k:
+            chosen.append(filename)
+    return sorted(chosen)
+
+def _parse_csv_range(byte_range, filename, width):
+    "Parses the CSV records in ``byte_range`` of ``filename``, in a worker"
+    (start, end) = byte_range
+    with open(filename, 'rb') as infile:
+        infile.seek(start)
+        data = infile.read(end - start)
+    return list(_fit_rows(csv.reader(io.TextIOWrapper(BytesIO(data))), width))
+
+class _ParallelCSVReader(_RowReader):
+    """
+    Reads a single large CSV file with a pool of ``workers`` processes
+    (or threads, if ``pool='thread'``).  The file is memory-mapped and
+    split into byte ranges of about ``chunk_bytes`` at record boundaries,
+    which the workers parse; rows still come in file order.
+    """
+    chunk_bytes = 4 * 2**20
+
+    def __init__(self, filename, fieldnames=None, workers=2, pool='process',
+                 stats=None):
+        super().__init__()
+        self.filename = filename
+        self.fieldnames = fieldnames
+        self.workers = workers
+        self.pool = pool
+        self.stats = stats
+
+    def _counted(self, ranges):
+        "Counts each byte range in ``stats`` as it is handed to a worker"
+        for (start, end) in ranges:
+            if self.stats:
+                self.stats.add_bytes(end - start)
+            yield (start, end)
+
+    def _tuples(self):
+        with open(self.filename, 'rb') as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            (self.header, start) = _csv_header(data, self.fieldnames)
+            if self.stats:
+                self.stats.add_bytes(start)
+            ranges = self._counted(_csv_chunks(data, start, self.chunk_bytes))
+            for rows in _pool_map(_parse_csv_range, ranges, self.workers,
+                                  pool=self.pool, filename=self.filename,
+                                  width=len(self.header)):
+                yield from rows
+
+class _ExcelSheetReader(_RowReader):
+    """
+    Reads a worksheet, which is only loaded - by calling ``load_rows``,
+    which returns an iterator of lists of cell values - once its rows are
+    wanted.  The first row with any data holds the field names; ``unload``,
+    if given, is called once, after the last row or on ``close``.
+    """
+
+    def __init__(self, load_rows, name, unload=None):
+        super().__init__()
+        self.load_rows = load_rows
+        self.name = name
+        self.unload = unload
+
+    def _tuples(self):
+        rows = self.load_rows()
+        headings = []
+        for values in rows:
+            if any(values):
+                headings = [heading if heading else "Col%d" % (col_n + 1)
+                            for (col_n, heading) in enumerate(values)]
+                break
+        self.header = tuple(headings)
+        try:
+            yield from _fit_rows(rows, len(self.header))
+        finally:
+            self._unload()
+
+    def _unload(self):
+        (unload, self.unload) = (self.unload, None)
+        if unload:
+            unload()
+
+    def close(self):
+        super().close()
+        self._unload()  # even if no row was read
+
+class _SQLResultReader(_RowReader):
+    """
+    Produces a SQLAlchemy result's own row objects when iterated,
+    fetching ``fetch_size`` at a time, and returns ``connection``
+    to its pool once the rows run out.
+
+    Given ``connect``, ``result`` is instead a statement, executed on the
+    connection ``connect()`` returns when rows are first wanted - on the
+    thread that reads them, as drivers such as SQLite's require.
+    """
+
+    def __init__(self, result, name, connection=None, fetch_size=1000,
+                 connect=None):
+        super().__init__()
+        self.result = result
+        self.connect = connect
+        self.header = None if connect else tuple(result.keys())
+        self.name = name
+        self.connection = connection
+        self.fetch_size = fetch_size
+        self._buffer = deque()
+
+    def _fetch(self, size):
+        if self.connect:
+            (self.connection, self.connect) = (self.connect(), None)
+            self.result = self.connection.execute(self.result)
+            self.header = tuple(self.result.keys())
+        if self.result is None:  # closed before the statement ran
+            return []
+        rows = self.result.fetchmany(size)
+        if not rows:
+            self.close()
+        return rows
+
+    def close(self):
+        if self.connect:
+            (self.connect, self.result) = (None, None)
+        elif self.result is not None:
+            self.result.close()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __next__(self):
+        if not self._buffer:
+            self._buffer.extend(self._fetch(self.fetch_size))
+            if not self._buffer:
+                raise StopIteration
+        row = self._buffer.popleft()
+        if self.row_type:
+            return self._make_row(tuple(row))
+        return row
+
+    def batches(self, size):
+        if self._buffer:
+            rows = list(self._buffer)
+            self._buffer.clear()
+            yield (self.header, [tuple(r) for r in rows])
+        while True:
+            rows = self._fetch(size)
+            if not rows:
+                return
+            yield (self.header, [tuple(r) for r in rows])
+
+def _rows_to_batches(rows, size):
+    """
+    Groups rows of any kind into (header, list of value tuples),
+    starting a new batch with a widened header when a row brings
+    new keys.  Missing values are None.
+
+    >>> list(_rows_to_batches([{'a': 1}, {'a': 2, 'b': 3}, {'b': 4}], 5))
+    [(('a',), [(1,)]), (('a', 'b'), [(2, 3), (None, 4)])]
+    """
+    header = ()
+    batch = []
+    for row in rows:
+        if not hasattr(row, 'keys'):
+            row = OrderedDict(value=row)
+        keys = tuple(row.keys())
+        if keys != header:
+            new_keys = tuple(k for k in keys if k not in header)
+            if new_keys:
+                if batch:
+                    yield (header, batch)
+                    batch = []
+                header = header + new_keys
+            batch.append(tuple(row.get(k) for k in header))
+        else:
+            batch.append(tuple(row.values()))
+        if len(batch) >= size:
+            yield (header, batch)
+            batch = []
+    if batch:
+        yield (header, batch)
+
+def _column_array(values):
+    "A NumPy array of ``values`` if NumPy is installed, else a list"
+    if not numpy:
+        return list(values)
+    if len(set(type(v) for v in values)) == 1:
+        return numpy.array(values)
+    return numpy.array(values, dtype=object)
+
+_bool_values = {'true': True, 'false': False}
+
+# type name: (pattern every non-empty string value must match, converter)
+_types = OrderedDict([
+    ('bool', (re.compile(r'^(?i:true|false)$'),
+              lambda value: _bool_values[value.lower()])),
+    # leading zeros (zip codes, account numbers) mean a string
+    ('int', (re.compile(r'^[-+]?(0|[1-9][0-9]*)$'), int)),
+    ('float', (re.compile(r'^[-+]?((0|[1-9][0-9]*)(\.[0-9]*)?|\.[0-9]+)'
+                          r'([eE][-+]?[0-9]+)?$'), float)),
+    ('date', (re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}$'),
+              datetime.date.fromisoformat)),
+    ('datetime', (re.compile(r'^[0-9]{4}-[0-9]{2}-[0-9]{2}[T ][0-9]{2}:[0-9]{2}'
+                             r'(:[0-9]{2}(\.[0-9]{3}|\.[0-9]{6})?)?'
+                             r'([-+][0-9]{2}:[0-9]{2})?$'),
+                  datetime.datetime.fromisoformat)),
+    ('str', (re.compile(''), str)),
+])
+
+def _infer_type(values):
+    """
+    The first of ``_types`` all of ``values`` (non-empty strings) suit.
+
+    >>> _infer_type(['1', '-2']), _infer_type(['1', '2.5']), _infer_type(['007'])
+    ('int', 'float', 'str')
+    """
+    if not values:
+        return 'str'
+    for (type_name, (pattern, convert)) in _types.items():
+        if all(pattern.match(value) for value in values):
+            try:
+                for value in values:
+                    convert(value)
+            except (ValueError, KeyError):
+                continue
+            return type_name
+
+def _convert_column(values, field, type_name):
+    """
+    Returns a list of ``values`` with their strings converted to
+    ``type_name``; empty strings become None.
+    """
+    convert = _types[type_name][1]
+    try:
+        return list(map(convert, values))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        pass  # empty or not all strings; go one at a time
+    converted = []
+    for value in values:
+        if isinstance(value, str):
+            if not value:
+                value = None
+            else:
+                try:
+                    value = convert(value)
+                except (ValueError, KeyError):
+                    raise ParseException('%s: cannot read %r as %s'
+                                         % (field, value, type_name))
+        converted.append(value)
+    return converted
+
+class Schema(OrderedDict):
+    """
+    Field names, each with the type its string values are converted to
+    by ``Source(..., types=...)``: ``'bool'``, ``'int'``, ``'float'``,
+    ``'date'``, ``'datetime'`` or ``'str'``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for (field, type_name) in self.items():
+            if type_name not in _types:
+                raise ValueError('%s: type must be one of %s, not %r'
+                                 % (field, tuple(_types), type_name))
+
+    @classmethod
+    def infer(cls, columns):
+        """A Schema for ``columns``, (field name, values) pairs, judging
+        by their non-empty string values.  Fields with no string values
+        are left out."""
+        schema = cls()
+        for (field, values) in columns:
+            strings = [v for v in values if isinstance(v, str)]
+            if strings:
+                schema[field] = _infer_type([v for v in strings if v])
+        return schema
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as infile:
+            return cls(json.load(infile, object_pairs_hook=OrderedDict))
+
+    def save(self, filename):
+        with open(filename, 'w') as outfile:
+            json.dump(self, outfile, indent=2)
+
+class _TypedReader(_RowReader):
+    """
+    Converts the string values of ``reader``'s rows to the types in
+    ``schema`` a batch at a time, column by column.  Unless given, the
+    schema is inferred from the first ``sample`` rows (and saved to
+    ``save_to``, if given).
+    """
+
+    batch_size = 1000
+
+    def __init__(self, reader, schema=None, sample=1000, save_to=None):
+        super().__init__()
+        self.reader = reader
+        self.schema = schema
+        self.sample = sample
+        self.save_to = save_to
+        self._first = None
+
+    def infer(self):
+        "Returns the schema, inferring it from the first rows if need be"
+        if self.schema is None:
+            self._first = next(self.reader.batches(self.sample), None)
+            (header, rows) = self._first or ((), [])
+            self.schema = Schema.infer(zip(header, zip(*rows)))
+            if self.save_to:
+                self.schema.save(self.save_to)
+        return self.schema
+
+    def _converted(self, header, rows):
+        columns = list(zip(*rows))
+        for (i, field) in enumerate(header):
+            type_name = self.schema.get(field, 'str')
+            if type_name != 'str':
+                columns[i] = _convert_column(columns[i], field, type_name)
+        return list(zip(*columns))
+
+    def _tuples(self):
+        for (header, rows) in self.batches(self.batch_size):
+            yield from rows
+
+    def batches(self, size):
+        self.infer()
+        if self._pending:
+            yield (self.header, self._pending[::-1])
+            self._pending = []
+        batches = self.reader.batches(size)
+        if self._first:
+            batches = itertools.chain([self._first], batches)
+            self._first = None
+        for (header, rows) in batches:
+            self.header = header
+            yield (header, self._converted(header, rows))
+
+    def close(self):
+        super().close()
+        self.reader.close()
+
+class _TypedDicts(object):
+    "Like ``_TypedReader``, for sources whose rows are dicts"
+
+    batch_size = 1000
+
+    def __init__(self, rows, schema=None, sample=1000, save_to=None):
+        self.rows = rows
+        self.schema = schema
+        self.sample = sample
+        self.save_to = save_to
+        self._first = []
+        self._typed = None
+
+    def infer(self):
+        "Returns the schema, inferring it from the first rows if need be"
+        if self.schema is None:
+            self._first = list(itertools.islice(self.rows, self.sample))
+            columns = OrderedDict()
+            for row in self._first:
+                if hasattr(row, 'keys'):
+                    for (field, value) in row.items():
+                        columns.setdefault(field, []).append(value)
+            self.schema = Schema.infer(columns.items())
+            if self.save_to:
+                self.schema.save(self.save_to)
+        return self.schema
+
+    def _convert(self, rows):
+        "Converts the string values of a batch of ``rows`` in place"
+        for (field, type_name) in self.schema.items():
+            if type_name == 'str':
+                continue
+            having = [row for row in rows if hasattr(row, 'keys')
+                      and isinstance(row.get(field), str)]
+            values = _convert_column([row[field] for row in having],
+                                     field, type_name)
+            for (row, value) in zip(having, values):
+                row[field] = value
+        return rows
+
+    def _batches(self):
+        self.infer()
+        (rows, self._first) = (self._first, [])
+        while True:
+            rows.extend(itertools.islice(self.rows, self.batch_size - len(rows)))
+            if not rows:
+                return
+            yield self._convert(rows)
+            rows = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._typed is None:
+            self._typed = itertools.chain.from_iterable(self._batches())
+        return self._typed.__next__()
+
+    def close(self):
+        if hasattr(self.rows, 'close'):
+            self.rows.close()
+
+# begin deserializers
+
+# elements of an XML document read before choosing its records from
+# those read so far, if it has not ended by then
+_xml_prefix_elements = 10000
+
+def _xml_path_matcher(record_tag):
+    """Returns a function telling whether a list of open tags, root first,
+    ends with ``record_tag`` - a tag, or a ``/``-separated path of tags
+    (anchored at the root if it begins with ``/``)."""
+    steps = record_tag.strip('/').split('/')
+    if record_tag.startswith('/'):
+        return lambda path: path == steps
+    return lambda path: path[-len(steps):] == steps
+
+def _first_list_element(element, started=None):
+    """
+    (parent element, tag) of the elements ``_first_list_in`` would return
+    as the first list in ``_element_to_odict(element)``: of the first
+    element, depth first, with children of a tag found more than once,
+    those of the tag first found.  Only elements whose ids are in
+    ``started`` are considered, if it is given.
+    """
+    children = [child for child in element
+                if started is None or id(child) in started]
+    counts = OrderedDict()
+    for child in children:
+        counts[child.tag] = counts.get(child.tag, 0) + 1
+    for (tag, count) in counts.items():
+        if count > 1:
+            return (element, tag)
+    for child in children:
+        found = _first_list_element(child, started)
+        if found:
+            return found
+    return None
+
+def _find_xml_records(events, stack):
+    """Consumes ``iterparse`` events until the repeating element holding
+    the data is chosen, by ``_first_list_element``: from the whole
+    document, if it ends within ``_xml_prefix_elements`` elements, or
+    else from those read so far.  Returns (parent element, record tag)."""
+    (root, started, check_at) = (None, set(), _xml_prefix_elements)
+    first_tag = None
+    for (event, elem) in events:
+        if event == 'start':
+            if root is None:
+                root = elem
+            elif len(stack) == 1:
+                # the root's first child repeating settles it at once
+                if first_tag is None:
+                    first_tag = elem.tag
+                elif elem.tag == first_tag:
+                    stack.append(elem)
+                    return (root, first_tag)
+            stack.append(elem)
+            started.add(id(elem))
+            if len(started) > check_at:
+                # the parser runs ahead of the events, so the tree may
+                # hold elements not yet started, and incomplete
+                found = _first_list_element(root, started)
+                if found:
+                    return found
+                check_at += _xml_prefix_elements
+        else:
+            stack.pop()
+    found = root is not None and _first_list_element(root)
+    if found:
+        return found
+    raise ParseException('No list of repeating elements found in XML')
+
+def _eval_xml(target, record_tag=None, *args, **kwargs):
+    """
+    Yields an OrderedDict for each record element of an XML document
+    as soon as the element is complete, then discards it.
+
+    Record elements are those matching ``record_tag``, if given;
+    otherwise the first list of repeating elements, as ``_first_list_in``
+    finds it - in the first ``_xml_prefix_elements`` elements of longer
+    documents.  Reading stops when the records' parent element ends.
+    """
+    events = et.iterparse(target, events=('start', 'end'))
+    stack = []
+    if record_tag:
+        matches = _xml_path_matcher(record_tag)
+        path = []
+        record_depth = None
+        for (event, elem) in events:
+            if event == 'start':
+                stack.append(elem)
+                path.append(elem.tag)
+                if record_depth is None and matches(path):
+                    record_depth = len(stack)
+                continue
+            if len(stack) == record_depth:
+                yield _element_to_odict(elem)
+                record_depth = None
+            stack.pop()
+            path.pop()
+            if stack and record_depth is None:
+                stack[-1].remove(elem)
+        return
+    (parent, tag) = _find_xml_records(events, stack)
+    depth = next((n for (n, elem) in enumerate(stack) if elem is parent), None)
+    if depth is None:  # the parent has ended; nothing more is wanted
+        for child in parent:
+            if child.tag == tag:
+                yield _element_to_odict(child)
+        return
+    # elements outside the parent are not wanted; the path to it is open
+    for (elem, on_path) in zip(stack[:depth], stack[1:depth + 1]):
+        for child in list(elem):
+            if child is not on_path:
+                elem.remove(child)
+    # children before the one open are complete (if the parent has just
+    # started, none of its children have)
+    if depth + 1 < len(stack):
+        for child in list(parent):
+            if child is stack[depth + 1]:
+                break
+            if child.tag == tag:
+                yield _element_to_odict(child)
+            parent.remove(child)
+    for (event, elem) in events:
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem is parent:
+            return
+        if stack[-1] is parent:
+            if elem.tag == tag:
+                yield _element_to_odict(elem)
+            parent.remove(elem)
+
+class _JSONStream(object):
+    """Decodes JSON values one at a time from a file-like object,
+    holding only the unparsed remainder of the current chunk in memory."""
+
+    chunk_size = 65536
+    _whitespace = re.compile(r'[ \t\n\r]*')
+    _number_chars = frozenset('.eE+-0123456789')
+
+    def __init__(self, target):
+        self.target = target
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+
+    def _fill(self):
+        """Appends another chunk to the buffer, discarding what has
+        already been consumed.  Returns False at end of input."""
+        if self.eof:
+            return False
+        remainder = self.buffer[self.pos:]
+        # read at least as much as we already hold, so that a single
+        # very large value is decoded in linear rather than quadratic time
+        chunk = self.target.read(max(self.chunk_size, len(remainder)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = remainder + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        "Skips whitespace; returns the next character, or '' at end of input"
+        while True:
+            self.pos = self._whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        "Consumes and returns the next character, which must be in ``chars``"
+        char = self.peek()
+        if not char or char not in chars:
+            raise ParseException('Expected one of %s at %r' %
+                                 (chars, self.buffer[self.pos:self.pos+20]))
+        self.pos += 1
+        return char
+
+    def value(self):
+        "Decodes and consumes the next complete JSON value"
+        self.peek()
+        while True:
+            try:
+                (result, end) = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError as e:
+                truncated = (getattr(e, 'msg', '').startswith('Unterminated')
+                             or getattr(e, 'pos', 0) >= len(self.buffer) - 10)
+                if truncated and self._fill():
+                    continue
+                raise
+            # a number (or literal) ending exactly at the end of the buffer
+            # may continue in the next chunk - as may a number decoded
+            # short, at a '.', 'e' or '-' the chunk ended after
+            if end == len(self.buffer) or (
+                    isinstance(result, (int, float)) and
+                    self.buffer[end] in self._number_chars):
+                if self._fill():
+                    continue
+            self.pos = end
+            return result
+
+    def items(self):
+        "Yields each element of an array whose opening ``[`` is consumed"
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def json_loader(target, *args, **kwargs):
+    """
+    Yields rows from JSON as they are decoded, without loading the
+    whole document first.
+
+    - A top-level array yields its elements.
+    - A top-level object is searched for its first member holding an
+      array of objects (as ``_first_list_in`` does for XML), which is
+      streamed.  Otherwise the object is treated as by ``_ensure_rows``.
+    - Several top-level values in a row (concatenated or newline-delimited
+      JSON) yield one row per value.
+    """
+    stream = _JSONStream(target)
+    first = stream.peek()
+    if first == '[':
+        stream.expect('[')
+        yield from stream.items()
+        return
+    if first != '{':
+        if not first:
+            raise ParseException('No JSON data found')
+        yield from _ensure_rows(stream.value())
+        return
+    stream.expect('{')
+    result = OrderedDict()
+    if stream.peek() == '}':
+        stream.expect('}')
+    else:
+        while True:
+            key = stream.value()
+            stream.expect(':')
+            if stream.peek() == '[':
+                stream.expect('[')
+                if stream.peek() == '{':
+                    yield from stream.items()
+                    return
+                result[key] = list(stream.items())
+            else:
+                result[key] = stream.value()
+            if stream.expect(',}') == '}':
+                break
+    if stream.peek():
+        yield result
+        while stream.peek():
+            yield stream.value()
+    else:
+        yield from _ensure_rows(result)
+json_loader.__name__ = 'json_loader'
+
+def ndjson_loader(target, *args, **kwargs):
+    """
+    Yields one row per line of newline-delimited JSON,
+    reading a single line at a time.
+    """
+    decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
+    anchor = getattr(target, 'anchor', None)
+    if not anchor:
+        for line in target:
+            line = line.strip()
+            if line:
+                yield decoder.decode(line)
+        return
+    count = 0
+    anchor(0)
+    for line in target:
+        line = line.strip()
+        if line:
+            yield decoder.decode(line)
+            count += 1
+            if not count % target.anchor_every:
+                anchor(count)
+
+def pickle_loader(target, *args, **kwargs):
+    """
+    Yields rows from a pickled list (or dict), or from a file of
+    several objects pickled one after another, which can be read
+    one row at a time.
+    """
+    result = pickle.load(target)
+    yield from _ensure_rows(result)
+    while True:
+        try:
+            result = pickle.load(target)
+        except EOFError:
+            return
+        yield from _ensure_rows(result)
+pickle_loader.__name__ = 'pickle_loader'
+
+def _eval_file_obj(target, *args, **kwargs):
+    result = eval(target.read())
+    if isinstance(result, list):
+        for itm in result:
+            yield itm
+    else:
+        yield result
+
+def _interpret_fieldnames(target, fieldnames):
+    try:
+        fieldname_line_number = int(fieldnames)
+    except (ValueError, TypeError):
+        return fieldnames
+    reader = csv.reader(target)
+    if fieldnames == 0:
+        num_columns = len(reader.__next__())
+        fieldnames = ['Field%d' % (i+1) for i in range(num_columns)]
+    else:
+        for i in range(fieldname_line_number):
+            fieldnames = reader.__next__()
+    return fieldnames
+
+def _eval_csv(target, fieldnames=None, *args, **kwargs):
+    """
+    Yields OrderedDicts from a CSV string
+    """
+    return _CSVReader(target, fieldnames)
+
+class _HTMLTable(object):
+    """
+    What ``_HTMLTableParser`` has learned about one table.  Each row
+    is a list of (tag, list of text fragments) per cell.  The table is
+    scored, from its first row alone, as soon as that row ends; the first
+    row (of ``<thead>``, if any) becomes ``header``, and later rows
+    outside ``<thead>`` and ``<tfoot>`` are appended to ``rows`` -
+    unless ``rows`` is None, because the table is not wanted.
+    """
+
+    def __init__(self, index, attrs, scored):
+        self.index = index
+        self.attrs = dict(attrs)
+        self.scored = scored
+        self.score = None
+        self.has_thead = False
+        self.section = None
+        self.header = None
+        self.rows = deque()
+        self.row = None
+        self.cell = None
+
+    def start_section(self, tag):
+        self.end_row()
+        self.section = tag
+        if tag == 'thead':
+            self.has_thead = True
+
+    def start_row(self):
+        self.end_row()
+        self.row = []
+
+    def start_cell(self, tag):
+        if self.row is None:
+            self.row = []
+        self.cell = []
+        self.row.append((tag, self.cell))
+
+    def end_row(self):
+        "Files the row being read, if there is one"
+        (row, self.row, self.cell) = (self.row, None, None)
+        if row is None:
+            return
+        if self.score is None:
+            n_headings = sum(1 for (tag, text) in row if tag == 'th')
+            n_columns = len(row) - n_headings
+            self.score = n_columns * 3 + n_headings * 10 + n_columns
+            if self.has_thead:
+                self.score += 3
+            self.scored(self)
+        if self.header is None:
+            headers = ([''.join(text) for (tag, text) in row if tag == 'th']
+                       or [''.join(text) for (tag, text) in row])
+            self.header = tuple(header or "Field%d" % (col_num + 1)
+                                for (col_num, header) in enumerate(headers))
+        elif self.rows is not None and self.section not in ('thead', 'tfoot'):
+            self.rows.append([''.join(text) for (tag, text) in row
+                              if tag == 'td'])
+
+class _HTMLTableParser(html.parser.HTMLParser):
+    """
+    Follows the tables of an HTML document through ``html.parser``'s
+    events, without building a tree.  If ``wanted`` is given, it picks
+    the table to read, whose rows are collected as they are parsed;
+    otherwise, only the rows of the best-scoring table so far are kept,
+    since a later table may yet score better.
+    """
+
+    def __init__(self, wanted=None):
+        super().__init__(convert_charrefs=True)
+        self.wanted = wanted
+        self.open_tables = []
+        self.table_count = 0
+        self.chosen = None
+        self.in_script = 0
+
+    def _scored(self, table):
+        if self.wanted:
+            return
+        if self.chosen is None or table.score > self.chosen.score:
+            if self.chosen is not None:
+                self.chosen.rows = None
+            self.chosen = table
+        else:
+            table.rows = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            table = _HTMLTable(self.table_count, attrs, self._scored)
+            self.table_count += 1
+            if self.wanted:
+                if self.chosen is None and self.wanted(table):
+                    self.chosen = table
+                else:
+                    table.rows = None
+            self.open_tables.append(table)
+        elif not self.open_tables:
+            return
+        elif tag in ('td', 'th'):
+            self.open_tables[-1].start_cell(tag)
+        elif tag == 'tr':
+            self.open_tables[-1].start_row()
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            self.open_tables[-1].start_section(tag)
+        elif tag in ('script', 'style'):
+            self.in_script += 1
+
+    def handle_endtag(self, tag):
+        if not self.open_tables:
+            return
+        table = self.open_tables[-1]
+        if tag == 'table':
+            table.end_row()
+            self.open_tables.pop()
+        elif tag in ('td', 'th'):
+            table.cell = None
+        elif tag == 'tr':
+            table.end_row()
+        elif tag in ('thead', 'tbody', 'tfoot'):
+            table.end_row()
+            table.section = None
+        elif tag in ('script', 'style'):
+            self.in_script = max(self.in_script - 1, 0)
+
+    def handle_data(self, data):
+        if self.in_script:
+            return
+        # a cell's text includes the text of any table nested in it
+        for table in self.open_tables:
+            if table.cell is not None:
+                table.cell.append(data)
+
+    def close(self):
+        super().close()
+        while self.open_tables:
+            self.open_tables.pop().end_row()
+
+_simple_table_selector = re.compile(r"^(table)?((?:[#.][\w-]+)*)$")
+
+def _html_table_matcher(table):
+    """
+    Returns a function telling whether an ``_HTMLTable`` is the one
+    ``table`` - an index, or a CSS selector like ``#id`` or
+    ``table.wikitable`` - selects; None if ``table`` is a selector too
+    complex to check without a document tree.
+    """
+    try:
+        index = int(table)
+        return lambda tbl: tbl.index == index
+    except ValueError:
+        pass
+    match = _simple_table_selector.match(table.strip())
+    if not match or not match.group(0):
+        return None
+    parts = re.findall(r"[#.][\w-]+", match.group(2))
+    ids = set(part[1:] for part in parts if part[0] == '#')
+    classes = set(part[1:] for part in parts if part[0] == '.')
+    return lambda tbl: (ids <= set([tbl.attrs.get('id')]) and
+                        classes <= set((tbl.attrs.get('class') or '').split()))
+
+def _html_table_index(page, selector):
+    "Finds the index of the table matching a CSS ``selector``, with bs4"
+    if not bs4:
+        raise ImportError("BeautifulSoup4 not installed")
+    soup = bs4.BeautifulSoup(page, 'html.parser')
+    selected = soup.select_one(selector)
+    for (index, tbl) in enumerate(soup.find_all('table')):
+        if tbl is selected:
+            return index
+    raise ParseException('No HTML table matches %s' % selector)
+
+class _HTMLTableReader(_RowReader):
+    """
+    Reads the rows of one table in an HTML document, ``chunk_size``
+    characters at a time.  ``table`` may select the table by index,
+    ``id`` or CSS selector, in which case its rows are produced as they
+    are parsed; by default (``'*'``), the best-scoring table is read,
+    once the whole document has been.
+    """
+    chunk_size = 65536
+
+    def __init__(self, target, table='*'):
+        super().__init__()
+        self.target = target
+        self.table = table
+
+    def _tuples(self):
+        target = self.target
+        if isinstance(target, str):
+            target = StringIO(target)
+        wanted = None
+        if self.table != '*':
+            wanted = _html_table_matcher(self.table)
+            if wanted is None:
+                page = target.read()
+                target = StringIO(page)
+                wanted = _html_table_matcher(_html_table_index(page, self.table))
+        parser = _HTMLTableParser(wanted)
+        while True:
+            chunk = target.read(self.chunk_size)
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+            table = parser.chosen
+            if table is not None and table.rows and (wanted or not chunk):
+                if self.header is None:
+                    self.header = table.header
+                rows = table.rows
+                table.rows = deque()
+                yield from _fit_rows(rows, len(self.header))
+            if not chunk:
+                break
+        if parser.chosen is None:
+            if wanted:
+                raise ParseException('No HTML table matches %s' % self.table)
+            raise ParseException('No HTML tables found')
+        self.header = parser.chosen.header
+
+def _html_to_odicts(page, table='*', *args, **kwargs):
+    "Reads the rows of a table in an HTML document (see ``_HTMLTableReader``)"
+    return _HTMLTableReader(page, table)
+
+# end deserializers
+
+_yaml_start = re.compile(r"^(---|-( |$)|[\w .'\"-]+:( |$))")
+
+def _sniff(prefix):
+    r"""
+    Guesses the format of data from its first few kilobytes, without
+    parsing it; returns the likeliest deserializers, best first.
+
+    >>> [f.__name__ for f in _sniff('[{"a": 1}]')]
+    ['json_loader', '_eval_file_obj', 'ordered_yaml_load']
+    >>> [f.__name__ for f in _sniff('name,kg\nAlfred,22\nEmily,0.3\n')]
+    ['_eval_csv']
+    """
+    if isinstance(prefix, bytes):
+        if prefix.startswith(b'\x80'):
+            return [pickle_loader, ]
+        prefix = prefix.decode('latin-1')
+    text = prefix.lstrip('\ufeff \t\r\n')
+    if text.startswith('<'):
+        start = text[:2048].lower()
+        if '<table' in start or '<html' in start or '<!doctype html' in start:
+            return [_html_to_odicts, _eval_xml]
+        return [_eval_xml, _html_to_odicts]
+    if text.startswith('[') or text.startswith('{'):
+        return [json_loader, _eval_file_obj, ordered_yaml_load]
+    lines = [l for l in text.splitlines()[:20] if l.strip()]
+    if not lines:
+        return []
+    if _yaml_start.search(lines[0]):
+        return [ordered_yaml_load, ]
+    if len(lines) > 2:
+        lines = lines[:-1]  # last line may be cut short
+    for delimiter in ',\t;|':
+        counts = [l.count(delimiter) for l in lines]
+        commonest = max(set(counts), key=counts.count)
+        if commonest and counts.count(commonest) * 2 >= len(counts):
+            return [_eval_csv, ]
+    return []
+
+_decompressors = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+_compression_magic = ((b'\x1f\x8b', '.gz'), (b'BZh', '.bz2'),
+                      (b'\xfd7zXZ\x00', '.xz'), (b'PK\x03\x04', '.zip'))
+_binary_extensions = ('.pickle', '.xls', '.xlsx')
+_zip_based_extensions = ('.xlsx', )
+
+def _compression_of(name):
+    """
+    Returns ``name`` without any compression suffix, and that suffix.
+
+    >>> _compression_of('events.json.gz')
+    ('events.json', '.gz')
+    >>> _compression_of('events.json')
+    ('events.json', None)
+    """
+    (stem, ext) = os.path.splitext(name)
+    if ext.lower() in _decompressors or ext.lower() == '.zip':
+        return (stem, ext.lower())
+    return (name, None)
+
+def _magic_compression(prefix):
+    "The compression suffix suiting the first bytes of some data, if any"
+    for (magic, compression) in _compression_magic:
+        if prefix.startswith(magic):
+            return compression
+
+def _decompress(target, compression, name):
+    """
+    Returns a binary stream decompressing ``target`` (a filename or
+    binary file object), and the name of the data it holds.  For zip
+    archives, that is the first file in the archive.
+    """
+    if compression != '.zip':
+        return (_decompressors[compression](target, 'rb'), name)
+    archive = zipfile.ZipFile(target)
+    members = [m for m in archive.infolist() if not m.filename.endswith('/')]
+    if not members:
+        raise ParseException('No files in zip archive %s' % name)
+    stream = archive.open(members[0])
+    archive.close()  # the archive's file stays open until ``stream`` closes
+    return (stream, members[0].filename)
+
+class _CountingFile(io.RawIOBase):
+    "Wraps a binary file, adding the bytes read from it to a ``SourceStats``"
+
+    def __init__(self, raw, stats):
+        self.raw = raw
+        self.stats = stats
+
+    @property
+    def name(self):
+        return self.raw.name
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.raw.seekable()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.raw.seek(offset, whence)
+
+    def tell(self):
+        return self.raw.tell()
+
+    def readinto(self, buffer):
+        count = self.raw.readinto(buffer)
+        self.stats.add_bytes(count or 0)
+        return count
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+def _open_file(filename, stats=None):
+    """
+    Opens a file - decompressing it as it is read, if it is gzip, bz2,
+    xz or zip compressed - in binary mode if the data is pickled or
+    ``.xls``, otherwise in text mode.  Returns the file and the name
+    of the data it holds (``filename`` without any compression suffix).
+    Bytes read are counted in ``stats``, if given.
+    """
+    (name, compression) = _compression_of(filename)
+    if not compression and not name.lower().endswith(_zip_based_extensions):
+        with open(filename, 'rb') as infile:
+            compression = _magic_compression(infile.read(6))
+    if compression:
+        (stream, name) = _decompress(filename, compression, name)
+    elif stats:
+        stream = open(filename, 'rb', buffering=0)
+    else:
+        stream = open(filename, 'rb')
+    if stats:
+        stream = io.BufferedReader(_CountingFile(stream, stats))
+    if name.lower().endswith(_binary_extensions):
+        return (stream, name)
+    return (io.TextIOWrapper(stream), name)
+
+def _open_counted(filename, stats=None):
+    "Opens a file, uncompressed, as a buffered binary stream counted in ``stats``"
+    raw = open(filename, 'rb', buffering=0)
+    if stats:
+        raw = _CountingFile(raw, stats)
+    return io.BufferedReader(raw)
+
+class _TrackedText(object):
+    """
+    Iterates over the lines of binary file ``infile`` as text, from byte
+    ``offset`` - where row ``row`` of the file begins - to byte ``end``,
+    keeping ``offset`` just after the last line produced.  Readers call
+    ``anchor`` as they parse, to note where rows begin, so that reading
+    can later resume from there (see ``Source.checkpoint``).
+    """
+
+    anchor_every = 1000
+
+    def __init__(self, infile, offset=0, row=0, end=None):
+        self.infile = infile
+        self.name = infile.name
+        self.start = (offset, row)
+        self.end = float('inf') if end is None else end
+        self.encoding = locale.getpreferredencoding(False)
+        self.seek(0)
+
+    def __iter__(self):
+        for line in self.infile:
+            if self.offset >= self.end:
+                return
+            if b'\r' in line:
+                yield from self._split(line)
+                continue
+            self.offset += len(line)
+            yield line.decode(self.encoding)
+
+    def _split(self, line):
+        "Ends lines at ``\\r\\n`` or ``\\r``, too, as universal newlines would"
+        for part in line.splitlines(keepends=True):
+            if self.offset >= self.end:
+                return
+            self.offset += len(part)
+            if part.endswith(b'\r\n'):
+                part = part[:-2] + b'\n'
+            elif part.endswith(b'\r'):
+                part = part[:-1] + b'\n'
+            yield part.decode(self.encoding)
+
+    def anchor(self, rows):
+        "Notes that ``rows`` rows after the starting row begin at ``offset``"
+        self.anchors.append((self.start[1] + rows, self.offset))
+
+    def seek(self, position):
+        "Returns to the starting offset (``position`` must be 0)"
+        self.infile.seek(self.start[0])
+        self.offset = self.start[0]
+        self.anchors = deque(maxlen=1000)
+
+    def close(self):
+        self.infile.close()
+
+def _open(filename):
+    """Opens a file in binary mode if its name ends with 'pickle',
+    decompressing it if it is compressed"""
+    return _open_file(filename)[0]
+
+def filename_from_url(url):
+    return os.path.splitext(os.path.basename(urllib.parse.urlsplit(url).path))[0]
+
+class _RewindableStream(io.RawIOBase):
+    """
+    Wraps a non-seekable binary stream, like an HTTP response body,
+    keeping what has been read so that it can be re-read from the start
+    while deserializers are tried.  After ``forget``, nothing more is
+    kept.  Everything read from ``raw`` is also written to ``sink``,
+    if given, whose ``complete`` is called at the end of the stream.
+    """
+
+    def __init__(self, raw, sink=None, stats=None):
+        self.raw = raw
+        self.sink = sink
+        self.stats = stats
+        self.kept = bytearray()
+        self.kept_from = 0  # stream position of kept[0]
+        self.pos = 0
+        self.keeping = True
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self.keeping
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('can only seek from the start')
+        if not (self.kept_from <= offset <= self.kept_from + len(self.kept)):
+            raise io.UnsupportedOperation('cannot seek to %d' % offset)
+        self.pos = offset
+        return offset
+
+    def forget(self):
+        "Stops keeping data for rereading; the stream is no longer seekable"
+        self.keeping = False
+        del self.kept[:self.pos - self.kept_from]
+        self.kept_from = self.pos
+
+    def readinto(self, buffer):
+        replay = self.kept_from + len(self.kept) - self.pos
+        if replay > 0:
+            start = self.pos - self.kept_from
+            data = self.kept[start:start + len(buffer)]
+            if not self.keeping and start + len(data) == len(self.kept):
+                self.kept = bytearray()
+                self.kept_from = self.pos + len(data)
+        else:
+            data = self.raw.read(len(buffer))
+            if self.stats:
+                self.stats.add_bytes(len(data))
+            if self.sink:
+                if data:
+                    self.sink.write(data)
+                else:
+                    self.sink.complete()
+                    self.sink = None
+            if self.keeping:
+                self.kept += data
+            else:
+                self.kept_from += len(data)
+        buffer[:len(data)] = data
+        self.pos += len(data)
+        return len(data)
+
+    def close(self):
+        if self.sink:
+            self.sink.discard()
+            self.sink = None
+        if hasattr(self.raw, 'close'):
+            self.raw.close()
+        super().close()
+
+class _HTTPCacheEntry(object):
+    "Writes a response body into an ``_HTTPCache``, as it is read"
+
+    def __init__(self, cache, url, metadata):
+        self.cache = cache
+        self.url = url
+        self.metadata = metadata
+        # unique to this thread, which may not be the only one fetching ``url``
+        (fd, self.temp_path) = tempfile.mkstemp(
+            suffix='.part', prefix=os.path.basename(cache.path(url, '.')),
+            dir=cache.directory)
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.file.write(data)
+
+    def complete(self):
+        self.file.close()
+        os.replace(self.temp_path, self.cache.path(self.url, '.body'))
+        with open(self.cache.path(self.url, '.json'), 'w') as outfile:
+            json.dump(self.metadata, outfile)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.temp_path)
+
+class _HTTPCache(object):
+    """
+    Keeps response bodies in ``directory`` with their ETag and
+    Last-Modified headers, so that later requests can be conditional
+    and a ``304 Not Modified`` answered from the disk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, url, suffix):
+        digest = hashlib.sha1(url.encode('utf8')).hexdigest()
+        return os.path.join(self.directory, digest + suffix)
+
+    def metadata(self, url):
+        try:
+            with open(self.path(url, '.json')) as infile:
+                return json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, url):
+        metadata = self.metadata(url) or {}
+        headers = {}
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+        return headers
+
+    def open(self, url):
+        "Returns (cached body as a binary file, its encoding)"
+        return (open(self.path(url, '.body'), 'rb'),
+                self.metadata(url)['encoding'])
+
+    def entry(self, url, response):
+        "Returns an ``_HTTPCacheEntry``, if ``response`` can be revalidated"
+        metadata = {'url': url, 'encoding': response.encoding,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')}
+        if metadata['etag'] or metadata['last_modified']:
+            return _HTTPCacheEntry(self, url, metadata)
+
+class _RowCache(object):
+    """
+    Keeps the rows deserialized from files in ``directory``, as
+    streams of pickled batches, named for the file's path, size,
+    modification time and the options used to read it.  Entries for
+    earlier versions of a file are removed when a new one is stored,
+    and the least recently used when the total exceeds ``max_size``.
+    """
+
+    suffix = '.rows'
+    batch_size = 1000
+
+    def __init__(self, directory, max_size):
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _keys(self, path, options):
+        stat = os.stat(path)
+        path_key = hashlib.sha1(os.path.abspath(path).encode('utf8')).hexdigest()
+        version_key = hashlib.sha1(repr((stat.st_size, stat.st_mtime_ns)).encode(
+            'utf8')).hexdigest()[:16]
+        options_key = hashlib.sha1(repr(options).encode('utf8')).hexdigest()[:16]
+        return (path_key, version_key, options_key)
+
+    def _path(self, keys):
+        return os.path.join(self.directory, '-'.join(keys) + self.suffix)
+
+    def replay(self, path, options):
+        "Returns (table name, generator of cached rows), or None"
+        cache_path = self._path(self._keys(path, options))
+        try:
+            infile = open(cache_path, 'rb')
+        except OSError:
+            return None
+        os.utime(cache_path)  # recently used
+        header = pickle.load(infile)
+        return (header['table_name'], self._rows(infile))
+
+    def _rows(self, infile):
+        with infile:
+            while True:
+                try:
+                    batch = pickle.load(infile)
+                except EOFError:
+                    return
+                yield from batch
+
+    def record(self, path, options, table_name, rows):
         """
-        Preserves order with OrderedDict as yaml is loaded
-        Thanks to coldfix
-        http://stackoverflow.com/questions/5121931/in-python-how-can-you-load-yaml-mappings-as-ordereddicts
+        Yields ``rows``, storing them in the cache if all of them are
+        read (and can be pickled).
         """
-        class OrderedLoader(Loader):
-            pass
-        OrderedLoader.add_constructor(
-            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
-            lambda loader, node: object_pairs_hook(loader.construct_pairs(node)))
-        result = yaml.load(stream, OrderedLoader)
-        result = _ensure_rows(result)
-        return iter(result)
-else:
-    def ordered_yaml_load(*args, **kwargs):
-        raise ImportError('pyyaml not installed')
+        keys = self._keys(path, options)
+        cache_path = self._path(keys)
+        (fd, temp_path) = tempfile.mkstemp(
+            suffix='.part', prefix=os.path.basename(cache_path) + '.',
+            dir=self.directory)
+        outfile = os.fdopen(fd, 'wb')
+        (rows, batch) = (iter(rows), [])
+        try:
+            pickle.dump({'table_name': table_name}, outfile, pickle.HIGHEST_PROTOCOL)
+            for row in rows:
+                batch.append(row)
+                yield row
+                if len(batch) >= self.batch_size:
+                    outfile = self._write(outfile, batch)
+                    batch = []
+                    if not outfile:
+                        break
+            else:
+                if self._write(outfile, batch):
+                    outfile.close()
+                    os.replace(temp_path, cache_path)
+                    self._evict(keys)
+                return
+        finally:
+            if outfile and not outfile.closed:
+                outfile.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        yield from rows  # not cached, nor kept
+
+    def _write(self, outfile, batch):
+        "Returns ``outfile``, or None if ``batch`` could not be pickled"
+        try:
+            pickle.dump(batch, outfile, pickle.HIGHEST_PROTOCOL)
+            return outfile
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logging.info('Not caching rows: %s' % e)
+            outfile.close()
+            return None
+
+    def _evict(self, keys):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            entry_path = os.path.join(self.directory, name)
+            if name.startswith(keys[0]) and name.split('-')[1] != keys[1]:
+                os.remove(entry_path)  # from an earlier version of the file
+                continue
+            stat = os.stat(entry_path)
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        total = sum(size for (mtime, size, entry_path) in entries)
+        for (mtime, size, entry_path) in sorted(entries):
+            if total <= self.max_size:
+                break
+            os.remove(entry_path)
+            total -= size
 
-def _element_to_odict(element):
-    """Given an ElementTree element, return a version of it
-    expressed in OrderedDictionaries."""
-    result = OrderedDict()
-    #if hasattr(element, 'tag') and element.tag:
-    result['tag'] = element.tag
-    for (k, v) in element.items():
-        result[k] = v
-    for child in element:
-        c = _element_to_odict(child)
-        if child.tag in result:
-            if isinstance(result[child.tag], list):
-                result[child.tag].append(c)
+def _line_ranges(data, start=0):
+    "Yields the (start, end) byte range of each line of ``data`` from ``start``"
+    (size, eol) = (len(data), _newline(data, start))
+    while start < size:
+        end = data.find(eol, start) + 1 or size
+        yield (start, end)
+        start = end
+
+class _RowIndex(object):
+    """
+    Byte offsets of every ``every``-th row of an uncompressed ``.csv`` or
+    ``.ndjson`` file, so that reading can start at any row without
+    parsing those before it.  Kept beside the file (as ``filename +
+    suffix``), and rebuilt when the file's size or modification time,
+    ``fieldnames`` or ``every`` change.
+    """
+
+    suffix = '.rowidx'
+    extensions = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+    def __init__(self, filename, fieldnames=None, every=1000):
+        self.filename = filename
+        self.path = filename + self.suffix
+        self.format = self.extensions[os.path.splitext(filename)[1].lower()]
+        stat = os.stat(filename)
+        self.version = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                        'fieldnames': repr(fieldnames), 'every': every}
+        self.fieldnames = fieldnames
+        self.every = every
+        if not self._load():
+            self._build()
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self.path) as infile:
+                saved = json.load(infile)
+        except (OSError, ValueError):
+            return False
+        if saved['version'] != self.version:
+            return False
+        self.header = saved['header'] and tuple(saved['header'])
+        (self.rows, self.offsets) = (saved['rows'], saved['offsets'])
+        return True
+
+    def _build(self):
+        logging.info('Indexing rows of %s' % self.filename)
+        (self.header, self.rows, self.offsets) = (None, 0, [])
+        if not self.version['size']:
+            return
+        with open(self.filename, 'rb') as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if self.format == 'csv':
+                (self.header, start) = _csv_header(data, self.fieldnames)
+                records = _csv_chunks(data, start)
             else:
-                result[child.tag] = [result[child.tag], c]
+                records = _line_ranges(data)
+            for (start, end) in records:
+                # blank lines give no row
+                if end - start <= 2 or self.format == 'ndjson':
+                    if not data[start:end].strip():
+                        continue
+                if not self.rows % self.every:
+                    self.offsets.append(start)
+                self.rows += 1
+
+    def _save(self):
+        try:
+            with open(self.path, 'w') as outfile:
+                json.dump({'version': self.version, 'header': self.header,
+                           'rows': self.rows, 'offsets': self.offsets}, outfile)
+        except OSError as e:
+            logging.info('Could not save row index %s: %s' % (self.path, e))
+
+    def open_at(self, row_n, stats=None):
+        """
+        Returns the file, opened at its ``row_n``-th row (counting from 0,
+        after any header), and a reader of its rows from there.
+        """
+        stream = _open_counted(self.filename, stats)
+        if row_n < self.rows:
+            stream.seek(self.offsets[row_n // self.every])
         else:
-            result[child.tag] = c
-    if hasattr(element, 'text') and hasattr(element.text, 'strip'):
-        text = element.text.strip()
-        if text:
-            if len(result) == 1: # just 'tag'
-                return text
-            result['text'] = text
-    return result
+            stream.seek(0, io.SEEK_END)
+        stream = io.TextIOWrapper(stream)
+        if self.format == 'csv':
+            reader = _CSVReader(stream, self.header)
+            values = reader._value_tuples()
+        else:
+            reader = values = ndjson_loader(stream)
+        if row_n < self.rows:
+            deque(itertools.islice(values, row_n % self.every), maxlen=0)
+        return (stream, reader)
 
-def _first_list_in(element):
-    """Often the meaningful part of an XML doc is nested inside
-    one or more levels of elements that serve no purpose.
-    This function strips a data tree down to the first list
-    of actual data."""
-    if isinstance(element, list):
-        return element
-    if not hasattr(element, 'items'):
-        return None
-    for (k, v) in element.items():
-        if isinstance(v, list):
-            return v
-    for (k, v) in element.items():
-        child_list_found = _first_list_in(v)
-        if child_list_found:
-            return child_list_found
+def _guess_encoding(data):
+    "The likeliest encoding of bytes ``data``, or None if it cannot be guessed"
+    for detector in (charset_normalizer, chardet):
+        if detector:
+            return detector.detect(data)['encoding']
+    return None
 
-def _ensure_rows(result):
-    """data_dispenser is for rowlike sources.  If the data source
-       evaluates to a single dict instead of a listlike object,
-       transform a dict of dicts into a list of dicts, or
-       return a list (that contains the dict as its sole row).
-       >>> pprint.pprint(_ensure_rows({"a": 1, "b": 2}))
-       [{'a': 1, 'b': 2}]
-       >>> pprint.pprint(_ensure_rows({"a": {"a1": 1, "a2": 2}, "b": {"b1": 1, "b2": 2}}))
-       [{'a1': 1, 'a2': 2, 'name_': 'a'}, {'b1': 1, 'b2': 2, 'name_': 'b'}]
+_http_session = None
+_http_session_lock = threading.Lock()
 
-       otherwise just don't mess with it
-       >>> pprint.pprint(_ensure_rows([{"a1": 1, "a2": 2}, {"b1": 1, "b2": 2}]))
-       [{'a1': 1, 'a2': 2}, {'b1': 1, 'b2': 2}]
+def _session():
+    "The ``requests.Session`` shared by URL sources, pooling connections"
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+    return _http_session
+
+
+def _select_rows(rows, where=None, columns=None):
     """
-    if isinstance(result, dict):
-        if not result:
-            result = []
-        # if it's a dict of dicts, convert to a list of dicts
-        if not [s for s in result.values() if not hasattr(s, 'keys')]:
-            result = [dict(name_=k, **result[k]) for k in result]
-        else:
-            result = [result, ]
-    return result
+    Yields those ``rows`` whose values match all of ``where``,
+    limited to the fields in ``columns``.
+    """
+    for row in rows:
+        if where and not all(row.get(k) == v for (k, v) in where.items()):
+            continue
+        if columns:
+            row = OrderedDict((c, row.get(c)) for c in columns)
+        yield row
 
-class ParseException(Exception):
-    pass
+def _read_rows(src, **kwargs):
+    "Reads all rows of one file of a multi-file source, in a worker"
+    return list(Source(src, **kwargs))
 
-# begin deserializers
+def _pool_map(func, items, workers, ordered=True, pool='process', **kwargs):
+    """
+    Yields ``func(item, **kwargs)`` for each of ``items``, computed by a
+    pool of ``workers`` processes (or threads, if ``pool='thread'``),
+    with no more than two items per worker read ahead.
 
-def _eval_xml(target, *args, **kwargs):
-    root = et.parse(target).getroot()
-    data = _element_to_odict(root)
-    data = _first_list_in(data)
-    return iter(data)
+    If ``ordered``, results are yielded in the order of ``items``;
+    otherwise, in the order they finish.
+    """
+    executors = {'process': concurrent.futures.ProcessPoolExecutor,
+                 'thread': concurrent.futures.ThreadPoolExecutor}
+    executor = executors[pool](max_workers=workers)
+    items = iter(items)
+    pending = deque(executor.submit(func, item, **kwargs)
+                    for item in itertools.islice(items, workers * 2))
+    try:
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                (done, not_done) = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(func, item, **kwargs))
+            yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
 
-def json_loader(target, *args, **kwargs):
-    result = json.load(target, object_pairs_hook=OrderedDict)
-    result = _ensure_rows(result)
-    return iter(result)
-json_loader.__name__ = 'json_loader'
+def _parallel_rows(sources, workers, ordered=True, pool='process', **kwargs):
+    """
+    Yields the rows of each of ``sources``, parsed by a pool of
+    ``workers`` processes (or threads, if ``pool='thread'``).
 
-def pickle_loader(target, *args, **kwargs):
-    result = pickle.load(target)
-    result = _ensure_rows(result)
-    return iter(result)
-pickle_loader.__name__ = 'pickle_loader'
+    If ``ordered``, files' rows are yielded in the order of ``sources``;
+    otherwise, in the order the files finish parsing.
+    """
+    for rows in _pool_map(_read_rows, sources, workers, ordered=ordered,
+                          pool=pool, **kwargs):
+        yield from rows
 
-def _eval_file_obj(target, *args, **kwargs):
-    result = eval(target.read())
-    if isinstance(result, list):
-        for itm in result:
-            yield itm
-    else:
-        yield result
 
-def _interpret_fieldnames(target, fieldnames):
+class _Counted(object):
+    "Iterates over ``rows``, counting them in ``count``"
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.rows.__next__()
+        self.count += 1
+        return row
+
+    def close(self):
+        if hasattr(self.rows, 'close'):
+            self.rows.close()
+
+def _read_ahead(rows, counted, chunk_size, chunks, stop):
+    """
+    Puts ``rows`` on queue ``chunks`` as (list of rows, list of
+    ``counted.count`` after each, None), ending with (rows, counts,
+    StopIteration or the exception raised) - unless ``stop`` is set first.
+    Then closes ``rows``, on this thread, as it was read.
+    """
+    (chunk, counts, end) = ([], [], StopIteration())
     try:
-        fieldname_line_number = int(fieldnames)
-    except (ValueError, TypeError):
-        return fieldnames
-    reader = csv.reader(target)
-    if fieldnames == 0:
-        num_columns = len(reader.__next__())
-        fieldnames = ['Field%d' % (i+1) for i in range(num_columns)]
-    else:
-        for i in range(fieldname_line_number):
-            fieldnames = reader.__next__()
-    return fieldnames
+        for row in rows:
+            if stop.is_set():
+                return
+            chunk.append(row)
+            if counted:
+                counts.append(counted.count)
+            if len(chunk) >= chunk_size:
+                chunks.put((chunk, counts, None))
+                (chunk, counts) = ([], [])
+    except BaseException as e:  # raised again for the consumer
+        end = e
+    finally:
+        try:
+            if hasattr(rows, 'close'):
+                rows.close()
+        finally:  # whatever happened, the consumer must not wait forever
+            if not stop.is_set():
+                chunks.put((chunk, counts, end))
 
-def _eval_csv(target, fieldnames=None, *args, **kwargs):
+class _Prefetcher(object):
     """
-    Yields OrderedDicts from a CSV string
+    Iterates over ``rows``, which a background thread reads up to about
+    ``size`` rows ahead, so that reading overlaps the work done on each
+    row.  The thread starts when the first row is wanted.  Exceptions
+    reach the consumer after the rows read before them.
+
+    If ``counted`` (a ``_Counted`` within ``rows``) is given, ``count``
+    is its count as of the row last produced, not as of the row last
+    read ahead.
     """
-    fieldnames = _interpret_fieldnames(target, fieldnames)
-    reader = csv.DictReader(target, fieldnames=fieldnames)
-    for row in reader:
-        yield OrderedDict((k, row[k]) for k in reader.fieldnames)
-
-def _table_score(tbl):
-    n_rows = len((tbl.tbody or tbl).findAll('tr', recursive=False))
-    n_headings = len((tbl.thead or tbl).tr.findAll('th', recursive=False))
-    n_columns = len(tbl.tr.findAll('td', recursive=False))
-    score = n_columns * 3 + n_headings * 10 + n_columns
-    if tbl.thead:
-        score += 3
-    return score
-
-def _html_to_odicts(html, *args, **kwargs):
-    if not bs4:
-        raise ImportError("BeautifulSoup4 not installed")
-    soup = bs4.BeautifulSoup(html)
-    tables = sorted(soup.find_all('table'), key=_table_score, reverse=True)
-    if not tables:
-        raise ParseException('No HTML tables found')
-    tbl = tables[0]
-    skips = 1
-    if (tbl.thead or tbl).tr.th:
-        headers = [th.text for th in (tbl.thead or tbl).tr.find_all('th', recursive=False)]
-    else:
-        headers = [td.text for td in (tbl.tbody or tbl).tr.find_all('td', recursive-False)]
-    for (col_num, header) in enumerate(headers):
-        header = header or "Field%d" % (col_num + 1)
-    for tr in (tbl.tbody or tbl).find_all('tr', recursive=False):
-        if skips > 0:
-            skips -= 1
-            continue
-        row = [td.text for td in tr.find_all('td')]
-        yield OrderedDict(zip(headers, row))
 
-# end deserializers
+    def __init__(self, rows, size, counted=None):
+        self.rows = rows
+        self.counted = counted
+        self.count = counted.count if counted else 0
+        self.chunk_size = max(1, size // 4)
+        self._chunks = queue.Queue(maxsize=max(1, size // self.chunk_size))
+        self._stop = threading.Event()
+        self._thread = None
+        (self._rows, self._counts, self._at, self._end) = ([], [], 0, None)
 
-def _open(filename):
-    """Opens a file in binary mode if its name ends with 'pickle'"""
-    if filename.lower().endswith('.pickle'):
-        file_mode = 'rb'
-    else:
-        file_mode = 'rU'
-    input_source = open(filename, file_mode)
-    return input_source
+    def __iter__(self):
+        return self
 
-def filename_from_url(url):
-    return os.path.splitext(os.path.basename(urllib.parse.urlsplit(url).path))[0]
+    def __next__(self):
+        while self._at == len(self._rows):
+            if self._end is not None:
+                if self.counted:  # includes rows passed over after the last
+                    self.count = self.counted.count
+                raise self._end
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=_read_ahead, daemon=True,
+                    args=(self.rows, self.counted, self.chunk_size,
+                          self._chunks, self._stop))
+                self._thread.start()
+            (self._rows, self._counts, self._end) = self._chunks.get()
+            self._at = 0
+        row = self._rows[self._at]
+        if self.counted:
+            self.count = self._counts[self._at]
+        self._at += 1
+        return row
+
+    def _cancel(self):
+        self._stop.set()
+        try:  # frees the thread, if waiting to queue a chunk
+            self._chunks.get_nowait()
+        except queue.Empty:
+            pass
+
+    def close(self):
+        "Stops the thread reading ahead, which closes ``rows``"
+        self._cancel()
+        if self._thread is not None:
+            self._thread.join()
+        elif hasattr(self.rows, 'close'):
+            self.rows.close()
+        (self._rows, self._at, self._end) = ([], 0, StopIteration())
 
+    def __del__(self):
+        # abandoned without ``close`` - the thread does not refer to this
+        self._cancel()
+
+def _checkpoint_default(value):
+    "Encodes key values that JSON cannot hold, for checkpoints"
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'$decimal': str(value)}
+    if type(value).__name__ == 'ObjectId':
+        return {'$oid': str(value)}
+    raise TypeError('cannot record a key of %r in a checkpoint' % (value, ))
+
+def _checkpoint_value(obj):
+    "Decodes values encoded by ``_checkpoint_default``"
+    if len(obj) == 1:
+        ((tag, value), ) = obj.items()
+        if tag == '$datetime':
+            return datetime.datetime.fromisoformat(value)
+        if tag == '$date':
+            return datetime.date.fromisoformat(value)
+        if tag == '$decimal':
+            return decimal.Decimal(value)
+        if tag == '$oid':
+            return importlib.import_module('bson').ObjectId(value)
+    return obj
+
+def _key_compare(columns, values, compare):
+    "A SQLAlchemy condition comparing (composite) key ``columns`` with ``values``"
+    if len(columns) == 1:
+        return compare(columns[0], values[0])
+    return compare(sqlalchemy.tuple_(*columns), sqlalchemy.tuple_(*values))
 
 class NamedIter(object):
     "Hack to let us assign attributes to an iterator"
@@ -246,6 +2273,73 @@ class NamedIter(object):
         self.__next__ = unnamed_iterator.__next__
 
 
+class SourceStats(object):
+    """
+    What a ``Source`` has done so far, available as its ``stats``.
+
+    - ``bytes_read``: from files (after any decompression) and URLs
+      (as received); for wildcard paths, the sum over the files
+      read in this process, whose own stats are in ``parts``
+    - ``rows``: rows produced
+    - ``deserializers``: (name, seconds, outcome) for each deserializer
+      tried on the data, including those that failed
+    - ``open_seconds``: spent recognizing and opening the source, of
+      which ``fetch_seconds`` waiting for a URL's response
+    - ``first_row_seconds``: from creating the ``Source`` to its first row
+    - ``elapsed`` and ``rows_per_second``: so far, or until the source
+      was exhausted or closed (``finished``)
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.started = time.perf_counter()
+        self.ended = None
+        self.own_bytes_read = 0
+        self.rows = 0
+        self.deserializers = []
+        self.open_seconds = None
+        self.fetch_seconds = None
+        self.first_row_seconds = None
+        self.parts = []
+
+    def add_bytes(self, count):
+        self.own_bytes_read += count
+
+    @property
+    def bytes_read(self):
+        return self.own_bytes_read + sum(part.bytes_read for part in self.parts)
+
+    @property
+    def finished(self):
+        return self.ended is not None
+
+    @property
+    def elapsed(self):
+        return (self.ended or time.perf_counter()) - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        "The statistics as a dict, for logging or metrics systems"
+        return OrderedDict([
+            ('source', self.source), ('bytes_read', self.bytes_read),
+            ('rows', self.rows), ('deserializers', list(self.deserializers)),
+            ('open_seconds', self.open_seconds),
+            ('fetch_seconds', self.fetch_seconds),
+            ('first_row_seconds', self.first_row_seconds),
+            ('elapsed', self.elapsed),
+            ('rows_per_second', self.rows_per_second),
+            ('finished', self.finished)])
+
+    def __repr__(self):
+        return 'SourceStats(%s)' % ', '.join(
+            '%s=%r' % item for item in self.as_dict().items()
+            if item[0] != 'deserializers')
+
+
 class Source(object):
     """
     A universal data generator that returns one "row" at
@@ -261,6 +2355,7 @@ class Source(object):
 
     - csv
     - json
+    - newline-delimited json (``.ndjson``, ``.jsonl``)
     - valid Python
     - Python pickle files
     - xml (experimental - returns first list of elements found)
@@ -280,6 +2375,8 @@ class Source(object):
 
     eval_funcs_by_ext = {'.py': [_eval_file_obj, ],
                          '.json': [json_loader, ],
+                         '.ndjson': [ndjson_loader, ],
+                         '.jsonl': [ndjson_loader, ],
                          '.yaml': [ordered_yaml_load, ],
                          '.yml': [ordered_yaml_load, ],
                          '.csv': [_eval_csv, ],
@@ -296,6 +2393,9 @@ class Source(object):
                              eval_funcs_by_ext['.yaml'] + \
                              eval_funcs_by_ext['.csv']
     table_count = 0
+    _table_count_lock = threading.Lock()
+    sniff_size = 8192
+    row_types = (None, 'dict', 'tuple', 'namedtuple', 'slots')
 
     def _source_is_generator(self, src):
         if hasattr(src, 'name'):
@@ -305,58 +2405,237 @@ class Source(object):
 
     def _source_is_mongo(self, src):
         self.table_name = src.name
-        self.generator = src.find()
+        projection = None
+        if self.columns:
+            projection = dict((c, 1) for c in self.columns)
+            if '_id' not in projection:
+                projection['_id'] = 0
+        if not projection or projection['_id']:
+            self._key = ('_id', )
+        conditions = [self.where] if self.where else []
+        resume = self._resume
+        if resume and 'key' in resume:
+            conditions.append({'_id': {'$gt': resume['key']['_id']}})
+        if self.shard:
+            conditions.append(self._mongo_shard(src))
+            self._sharded = True
+        query = {}
+        if len(conditions) == 1:
+            query = conditions[0]
+        elif conditions:
+            query = {'$and': conditions}
+        cursor = src.find(query, projection).sort('_id', 1)
+        if resume:
+            if 'key' not in resume:
+                cursor = cursor.skip(resume['rows'])
+            (self._base, self.skip) = (resume['rows'], 0)
+        if self.limit:
+            cursor = cursor.limit(self.limit)
+        self.generator = cursor.batch_size(self.fetch_size)
+        self._selected = True
         return
 
+    def _mongo_shard(self, src):
+        """A query for this shard's range of ``_id``, between those found
+        at every 1/n of the collection"""
+        (k, n) = self.shard
+        count = src.count_documents({})
+        (start, end) = (count * k // n, count * (k + 1) // n)
+        if start == end:
+            return {'_id': {'$in': []}}
+        bounds = {}
+        for (comparison, position) in (('$gte', start), ('$lt', end)):
+            if 0 < position < count:
+                ids = src.find({}, {'_id': 1}).sort('_id', 1).skip(position)
+                bounds[comparison] = next(iter(ids.limit(1)))['_id']
+        return {'_id': bounds} if bounds else {}
+
+    def _sniff_deserializers(self, open_file):
+        """Orders the fallback deserializers so that those suiting the
+        first few kilobytes of ``open_file`` are tried first."""
+        fallbacks = self.eval_funcs_by_ext['*']
+        try:
+            prefix = open_file.read(self.sniff_size)
+        except (UnicodeDecodeError, AttributeError):
+            return fallbacks
+        finally:
+            open_file.seek(0)
+        likely = _sniff(prefix)
+        return likely + [d for d in fallbacks if d not in likely]
+
     def _deserialize(self, open_file):
         self.file = open_file
+        if self.deserializers is self.eval_funcs_by_ext['*']:
+            self.deserializers = self._sniff_deserializers(open_file)
         errors = []
         for deserializer in self.deserializers:
             self.file.seek(0)
+            start = time.perf_counter()
             try:
-                self.generator = deserializer(open_file, fieldnames=self.fieldnames)
-                row_1 = self.generator.__next__()
-                self.file.seek(0)
+                generator = deserializer(open_file, fieldnames=self.fieldnames,
+                                         record_tag=self.record_tag,
+                                         table=self.table)
+                self.generator = generator
+                row_1 = generator.__next__()
                 if row_1:
                     if (deserializer == ordered_yaml_load and isinstance(row_1, str)
                         and len(row_1) == 1):
                         logging.info('false hit: reading `yaml` as a single string')
+                        self._tried(deserializer, start, 'false hit')
                         continue
-                    self.file.seek(0)
-                    self.generator = deserializer(open_file, fieldnames=self.fieldnames)
+                    # carry on from the rows already parsed, rather than
+                    # parsing again from the start
+                    if hasattr(generator, 'unread'):
+                        generator.unread(row_1)
+                    else:
+                        self.generator = itertools.chain([row_1, ], generator)
                     self.deserializer = deserializer
+                    self._tried(deserializer, start, 'ok')
                     return
                 else:
                     logging.info('%s found no items in first row of %s'
                                  % (deserializer, open_file))
+                    self._tried(deserializer, start, 'empty first row')
             except StopIteration:
                 self.file.seek(0)
                 self.deserializer = deserializer
+                self._tried(deserializer, start, 'no rows')
                 return
             except Exception as e:
                 logging.info('%s failed to deserialize %s' % (deserializer, open_file))
                 logging.info(str(e))
                 errors.append(str(e))
+                self._tried(deserializer, start, 'failed: %s' % e)
         raise SyntaxError("%s: Could not deserialize %s (tried %s)\nErrors:\n%s" % (
             self.table_name, open_file, ", ".join(str(s) for s in self.deserializers), "\n".join(errors)))
 
-    def _source_is_path(self, src):
-        (file_path, file_extension) = os.path.splitext(src)
+    def _tried(self, deserializer, start, outcome):
+        self.stats.deserializers.append(
+            (deserializer.__name__, time.perf_counter() - start, outcome))
+
+    def _source_is_path(self, src, table='*'):
+        (input_source, data_name) = _open_file(src, self.stats)
+        (file_path, file_extension) = os.path.splitext(data_name)
         self.table_name = os.path.split(file_path)[1]
         logging.info('Reading data from %s' % src)
         file_extension = file_extension.lower()
+        if file_extension == '.xls':  # compressed
+            with input_source:
+                return self._source_is_excel(input_source.read(), sheet=table)
+        if file_extension == '.xlsx':  # compressed
+            with input_source:
+                return self._source_is_xlsx(BytesIO(input_source.read()),
+                                            sheet=table, name=src)
+        if (self.index and not self.shard
+                and file_extension in _RowIndex.extensions and data_name == src):
+            input_source.close()
+            self.row_index = _RowIndex(src, self.fieldnames,
+                                       1000 if self.index is True else self.index)
+            (self.file, self.generator) = self.row_index.open_at(self.skip,
+                                                                 self.stats)
+            self._owns_file = True
+            self._skipped = True
+            return
+        if (self.workers and not self.shard and file_extension == '.csv'
+                and data_name == src and os.path.getsize(src)):
+            input_source.close()
+            self.generator = _ParallelCSVReader(src, self.fieldnames,
+                                                self.workers, self.pool,
+                                                self.stats)
+            return
+        if (file_extension in _RowIndex.extensions and data_name == src
+                and (self.checkpoints or self.shard or self._resume)):
+            # read lines as bytes, so rows' offsets are known
+            input_source.close()
+            (offset, row, end) = (0, 0, None)
+            if self.shard:
+                (offset, end) = self._file_shard(src, file_extension)
+                self._sharded = True
+            if self._resume and 'offset' in self._resume:
+                (offset, self.skip) = (self._resume['offset'],
+                                       self._resume['after'])
+                row = self._base = self._resume['rows'] - self.skip
+                self.fieldnames = self._resume.get('header', self.fieldnames)
+            input_source = _TrackedText(_open_counted(src, self.stats),
+                                        offset, row, end)
         self.deserializers = self.eval_funcs_by_ext.get(
             file_extension,
             self.eval_funcs_by_ext['*'])
         self.deserializer = None
-        input_source = _open(src)
+        self._owns_file = True
         self._deserialize(input_source)
+        if isinstance(input_source, _TrackedText):
+            self._tracked = (input_source, self.generator)
+
+    def _file_shard(self, filename, extension):
+        """The byte range of this shard of a ``.csv`` or ``.ndjson`` file's
+        records.  A CSV file's header becomes ``fieldnames``."""
+        if not os.path.getsize(filename):
+            return (0, 0)
+        with open(filename, 'rb') as infile, \
+                mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            if extension == '.csv':
+                (header, start) = _csv_header(data, self.fieldnames)
+                self.fieldnames = list(header)
+            (k, n) = self.shard
+            chunk_bytes = -(-(len(data) - start) // n)
+            ranges = _csv_chunks(data, start, chunk_bytes,
+                                 quoted=(extension == '.csv'))
+            for byte_range in itertools.islice(ranges, k, None):
+                return byte_range
+            return (len(data), len(data))
+
+    def _cache_options(self, table):
+        "Options that change the rows deserialized from a file"
+        return (self.fieldnames, table, self.record_tag)
+
+    def _source_is_cached(self, src, table):
+        self._row_cache = _RowCache(self.cache_dir, self.cache_size)
+        cached = self._row_cache.replay(src, self._cache_options(table))
+        if cached:
+            logging.info('Reading rows of %s from cache' % src)
+            (self.table_name, self.generator) = cached
+            self.from_cache = True
+        return self.from_cache
 
     def _multiple_sources(self, sources):
-        subsources = [Source(s, limit=self.limit) for s in sources]
+        # with ``types``, rows are typed - then selected and made rows of
+        # ``row_type`` - here, rather than in the subsources; so too with
+        # ``prefetch``, so that checkpoints count the rows consumed here
+        (row_type, where) = (self.row_type, self.where)
+        if self.types or self.prefetch:
+            (row_type, where) = (None, None)
+        (self._first_file, part) = (0, None)
+        if self._resume and 'file' in self._resume:
+            (self._first_file, part) = (self._resume['file'],
+                                        self._resume.get('part'))
+            (self._base, self.skip) = (self._resume['rows'], 0)
+        subsources = [Source(s, limit=self.limit, record_tag=self.record_tag,
+                             row_type=row_type, columns=self.columns,
+                             where=where, cache_dir=self.cache_dir,
+                             cache_size=self.cache_size,
+                             checkpoints=self.checkpoints or bool(self._resume),
+                             resume_from=None if n else part)
+                      for (n, s) in enumerate(sources[self._first_file:])]
         self.limit = None  # impose limit only on the subsources
+        self._selected = not (self.types or self.prefetch)
+        self.subsources = subsources
+        self.stats.parts = [subsource.stats for subsource in subsources]
         self.generator = itertools.chain.from_iterable(subsources)
 
+    def _parallel_sources(self, sources):
+        self.generator = _parallel_rows(sources, self.workers,
+                                        ordered=self.ordered, pool=self.pool,
+                                        limit=self.limit,
+                                        record_tag=self.record_tag,
+                                        columns=self.columns,
+                                        where=None if self.types else self.where,
+                                        cache_dir=self.cache_dir,
+                                        cache_size=self.cache_size)
+        self.limit = None  # impose limit only on the subsources
+        self._selected = not self.types
+
     _actual_ext_finder = re.compile(r"^(\.[A-Za-z]*)")
     def _source_is_url(self, src):
         self.table_name = filename_from_url(src)
@@ -365,15 +2644,64 @@ class Source(object):
         (core_url, ext) = os.path.splitext(src)
         ext = self._actual_ext_finder.search(ext)
         ext = (ext and ext.group(1).lower()) or '.html'
-        response = requests.get(src)
+        compression = None
+        if ext in _decompressors or ext == '.zip':
+            compression = ext
+            (core_url, ext) = os.path.splitext(core_url)
+            ext = ext.lower() or '*'
+        (body, encoding) = self._fetch(src)
+        stream = body
+        if not compression and not ext.endswith(_zip_based_extensions):
+            compression = _magic_compression(body.peek(6)[:6])
+        if compression == '.zip':
+            # zip archives' directories are at the end
+            (stream, name) = _decompress(BytesIO(body.read()), '.zip', src)
+            ext = os.path.splitext(name)[1].lower()
+        elif compression:
+            (stream, name) = _decompress(body, compression, src)
+            encoding = None  # the response's encoding was of the compressed data
         if ext and ext.endswith('.xls'):
-            return self._source_is_excel(response.content)
-        self.deserializers = self.eval_funcs_by_ext.get(ext or '*')
+            with stream:
+                return self._source_is_excel(stream.read())
+        if ext == '.xlsx':
+            with stream:
+                return self._source_is_xlsx(BytesIO(stream.read()))
+        self.deserializers = self.eval_funcs_by_ext.get(
+            ext, self.eval_funcs_by_ext['*'])
+        self._owns_file = True
         if ext == '.pickle':
-            self._deserialize(BytesIO(response.content))
+            self._deserialize(stream)
         else:
-            content = response.content.decode(response.encoding or response.apparent_encoding)
-            self._deserialize(StringIO(content))
+            if not encoding:
+                prefix = stream.read(self.sniff_size * 8)
+                stream.seek(0)
+                encoding = _guess_encoding(prefix)
+            self._deserialize(io.TextIOWrapper(stream, encoding=encoding or 'utf-8'))
+        if hasattr(body.raw, 'forget'):
+            body.raw.forget()
+
+    def _fetch(self, url):
+        """
+        Requests ``url`` through the shared session, returning its body
+        as a buffered binary stream (read as it arrives, and rewindable
+        until ``forget`` is called on its ``raw``) and its encoding.
+        """
+        cache = self.http_cache and _HTTPCache(self.http_cache)
+        headers = cache.conditional_headers(url) if cache else {}
+        start = time.perf_counter()
+        response = _session().get(url, stream=True, headers=headers)
+        self.stats.fetch_seconds = time.perf_counter() - start
+        self.http_status = response.status_code
+        if cache and response.status_code == 304:
+            response.close()
+            logging.info('Reading %s from HTTP cache' % url)
+            return cache.open(url)
+        response.raw.decode_content = True
+        sink = None
+        if cache and response.status_code == 200:
+            sink = cache.entry(url, response)
+        stream = _RewindableStream(response.raw, sink, self.stats)
+        return (io.BufferedReader(stream), response.encoding)
 
     def _source_is_open_file(self, src):
         if hasattr(src, 'name'):
@@ -381,76 +2709,368 @@ class Source(object):
         self.deserializers = self.eval_funcs_by_ext['*']
         self._deserialize(src)
 
-    def _source_is_excel_worksheet(self, sheet, name):
-        headings = ["Col%d" % c for c in range(1, sheet.ncols + 1)]
-        data = []
-        for row_n in range(sheet.nrows):
-            row_has_data = max(bool(v) for v in sheet.row_values(row_n))
-            if row_has_data:
-                headings = [heading if heading else default_heading
-                            for (heading, default_heading)
-                            in itertools.zip_longest(sheet.row_values(row_n), headings)]
-                row_n += 1
-                break
-        data = [OrderedDict(zip(headings, sheet.row_values(r)))
-                            for r in range(row_n,sheet.nrows)]
-        generator = NamedIter(iter(data))
-        generator.name = "%s-%s" % (name, sheet.name)
-        return generator
+    def _source_is_excel_worksheet(self, workbook, sheet_n, name, last=True):
+        def load_rows():
+            sheet = workbook.sheet_by_index(sheet_n)
+            return (sheet.row_values(row_n) for row_n in range(sheet.nrows))
+        def unload():
+            workbook.unload_sheet(sheet_n)
+            if last:  # closes the file
+                workbook.release_resources()
+        return _ExcelSheetReader(
+            load_rows, "%s-%s" % (name, workbook.sheet_names()[sheet_n]),
+            unload=unload)
+
+    def _excel_sheets(self, sheet_names, sheet, name, reader):
+        """
+        Reads the worksheet ``sheet`` (a name or index), or every
+        worksheet if ``sheet`` is ``'*'``; ``reader`` makes the
+        ``_ExcelSheetReader`` for the worksheet at an index.
+        """
+        if sheet == '*':
+            self._multiple_sources([reader(sheet_n) for sheet_n
+                                    in range(len(sheet_names))])
+            return
+        try:
+            sheet_n = int(sheet)
+        except ValueError:
+            try:
+                sheet_n = sheet_names.index(sheet)
+            except ValueError:
+                raise Exception("Sheet name or index %s not in workbook %s" % (sheet, name))
+        self.generator = reader(sheet_n)
+        self.table_name = self.generator.name
 
     def _source_is_excel(self, spreadsheet, sheet='*'):
         if not xlrd:
             raise ImportError('must ``pip install xlrd``')
+        # ``on_demand`` loads each worksheet only when it is read
         if len(spreadsheet) < 84 and spreadsheet.endswith('xls'):
-            workbook = xlrd.open_workbook(spreadsheet)
+            workbook = xlrd.open_workbook(spreadsheet, on_demand=True)
             name = spreadsheet
         else:
-            workbook = xlrd.open_workbook(file_contents=spreadsheet)
+            workbook = xlrd.open_workbook(file_contents=spreadsheet,
+                                          on_demand=True)
             name = "excel"
-        if sheet == '*':
-            generators = []
-            for sheet in workbook.sheets():
-                generators.append(self._source_is_excel_worksheet(sheet, name))
-            self._multiple_sources(generators)
-        else:
-            try:
-                sheet = workbook.sheets()[int(sheet)]
-            except ValueError:
-                try:
-                    workbook.sheet_names().index(sheet)
-                except ValueError:
-                    raise Exception("Sheet name or index %s not in workbook %s" % (sheet, name))
-            self.generator = self._source_is_excel_worksheet(sheet, name)
-            self.table_name = self.generator.name
+        self._excel_sheets(
+            workbook.sheet_names(), sheet, name,
+            lambda sheet_n: self._source_is_excel_worksheet(
+                workbook, sheet_n, name,
+                last=sheet != '*' or sheet_n == workbook.nsheets - 1))
+
+    def _source_is_xlsx(self, spreadsheet, sheet='*', name='excel'):
+        """
+        Reads ``spreadsheet``, a path or binary file, with openpyxl's
+        read-only mode, which parses rows as they are wanted rather
+        than loading whole worksheets.
+        """
+        if not openpyxl:
+            raise ImportError('must ``pip install openpyxl``')
+        workbook = openpyxl.load_workbook(spreadsheet, read_only=True,
+                                          data_only=True)
+
+        def reader(sheet_n):
+            worksheet = workbook.worksheets[sheet_n]
+            last = sheet != '*' or sheet_n == len(workbook.worksheets) - 1
+            def load_rows():
+                # empty cells as '', like xlrd's
+                return ([('' if value is None else value) for value in row]
+                        for row in worksheet.iter_rows(values_only=True))
+            return _ExcelSheetReader(
+                load_rows,
+                "%s-%s" % (name, worksheet.title),
+                unload=workbook.close if last else None)
+        self._excel_sheets(workbook.sheetnames, sheet, name, reader)
 
     def _source_is_sqlalchemy_metadata(self, src, table):
         meta = src
         self.db_engine = meta.bind
-        connection = meta.bind.connect()
-        slct = sqlalchemy.sql.select([meta.tables[table]])
+
+        def connect():
+            # server-side cursor where the driver supports one,
+            # so the driver need not buffer the whole result
+            return meta.bind.connect().execution_options(
+                stream_results=True, max_row_buffer=self.fetch_size)
+
+        connection = connect()
+        tbl = meta.tables[table]
+        if self.columns:
+            slct = sqlalchemy.sql.select([tbl.c[c] for c in self.columns])
+        else:
+            slct = sqlalchemy.sql.select([tbl])
+        if self.where:
+            slct = slct.where(sqlalchemy.and_(
+                *[tbl.c[k] == v for (k, v) in self.where.items()]))
+        # in key order, so that reading can resume after the last key read
+        key = tuple(c.name for c in tbl.primary_key.columns)
+        if key:
+            slct = slct.order_by(*[tbl.c[k] for k in key])
+            if not self.columns or set(key) <= set(self.columns):
+                self._key = key
+        resume = self._resume
+        if resume:
+            if 'key' in resume:
+                slct = slct.where(_key_compare(
+                    [tbl.c[k] for k in resume['key']],
+                    list(resume['key'].values()), operator.gt))
+            else:
+                slct = slct.offset(resume['rows'])
+            (self._base, self.skip) = (resume['rows'], 0)
+        if self.shard and key:
+            slct = slct.where(self._sql_shard(connection, tbl, key))
+            self._sharded = True
+        if self.limit:
+            slct = slct.limit(self.limit)
+        self._selected = True
+        if self.prefetch:  # execute on the thread reading ahead
+            connection.close()
+            self.generator = _SQLResultReader(slct, table,
+                                              fetch_size=self.fetch_size,
+                                              connect=connect)
+            return
         result = connection.execute(slct)
-        self.generator = NamedIter(iter(result))
-        self.generator.name = table
+        self.generator = _SQLResultReader(result, table, connection,
+                                          self.fetch_size)
 
-    def __init__(self, src, limit=None, fieldnames=None, table='*'):
+    def _sql_shard(self, connection, tbl, key):
+        """
+        A condition selecting this shard's rows of ``tbl`` by its primary
+        ``key``: the remainder of an integer key, divided by the number of
+        shards, or else the range of keys between those found at every 1/n
+        of the table.
+        """
+        (k, n) = self.shard
+        columns = [tbl.c[name] for name in key]
+        if len(columns) == 1 and isinstance(columns[0].type, sqlalchemy.Integer):
+            return (columns[0] % n + n) % n == k  # never negative
+        count = connection.execute(sqlalchemy.select(
+            [sqlalchemy.func.count()]).select_from(tbl)).scalar()
+        (start, end) = (count * k // n, count * (k + 1) // n)
+        if start == end:
+            return sqlalchemy.false()
+        conditions = []
+        for (compare, position) in ((operator.ge, start), (operator.lt, end)):
+            if 0 < position < count:
+                bound = connection.execute(sqlalchemy.select(columns).order_by(
+                    *columns).offset(position).limit(1)).first()
+                conditions.append(_key_compare(columns, list(bound), compare))
+        return sqlalchemy.and_(sqlalchemy.true(), *conditions)
+
+    def __init__(self, src, limit=None, fieldnames=None, table='*',
+                 record_tag=None, workers=None, ordered=True, pool='process',
+                 row_type=None, fetch_size=1000, columns=None, where=None,
+                 http_cache=None, cache_dir=None, cache_size=2**30,
+                 hooks=None, hook_every=1000, types=None, type_sample=1000,
+                 index=None, skip=0, resume_from=None, shard=None,
+                 prefetch=None, checkpoints=False):
         '''
         For ``.csv`` and ``.xls``, field names will be taken from
         the first line of data found - unless ``fieldnames`` is given,
         in which case, it will override.  For ``.xls``, ``fieldnames``
         may be an integer, in which case it will be the (1-based) row number
         field names will be taken from (rows before that will be discarded).
+
+        For ``.xls`` and ``.xlsx``, ``table`` chooses a worksheet by name
+        or index; by default, all worksheets are read.  Each is loaded
+        only once its rows are wanted.
+
+        For XML, ``record_tag`` names the element (or ``/``-separated
+        path of elements) holding each row; by default, the first
+        list of repeating elements is used.
+
+        For HTML, ``table`` chooses a ``<table>`` by index, or by a CSS
+        selector such as ``'#results'``; by default, the table that looks
+        most like data (judging by its first row) is read.
+
+        For file paths with wildcards, ``workers`` files at a time will be
+        parsed in parallel, by processes (or threads, if ``pool='thread'``).
+        Rows come in filename order unless ``ordered=False``, which
+        yields each file's rows as soon as it is parsed.
+        A single, uncompressed ``.csv`` file is split into chunks, which
+        ``workers`` processes parse; its rows also stay in order.
+
+        ``row_type`` chooses a more compact alternative to an OrderedDict
+        for each row: ``'tuple'`` (a ``TupleRow``), ``'namedtuple'``
+        (a ``TupleRow`` with attribute access) or ``'slots'`` (a mutable
+        ``SlotsRow``).  Rows with the same fields share one row class.
+
+        SQLAlchemy tables are read through a server-side cursor where the
+        database driver supports one, ``fetch_size`` rows at a time.
+
+        ``columns`` limits each row to the named fields, and ``where``, a
+        dict of field names and values, keeps only rows with those values.
+        For SQLAlchemy and MongoDB sources, these and ``limit`` are passed
+        to the database as part of the query; other sources are filtered
+        as they are read.
+
+        URLs are read as the response arrives, over connections pooled
+        between sources.  ``http_cache`` names a directory in which to keep
+        responses; they are then requested again only if they have changed,
+        according to their ETag or Last-Modified headers.
+
+        ``cache_dir`` names a directory in which to keep the rows read from
+        files, so that reading an unchanged file again with the same options
+        replays them instead of parsing.  Least recently used files are
+        removed when the cache exceeds ``cache_size`` bytes.
+
+        ``stats`` (a ``SourceStats``) counts the bytes read, rows produced,
+        deserializers tried and time taken.  Each of ``hooks`` is called
+        with it every ``hook_every`` rows, and when reading ends.
+
+        ``types`` converts string values - as read from CSV, HTML and XML -
+        to ints, floats, bools, dates and datetimes, a batch of rows at a
+        time.  ``types=True`` infers a ``Schema`` from the first
+        ``type_sample`` rows; a dict (or ``Schema``) of field names and type
+        names is used as it is.  ``types`` may also name a JSON file: the
+        schema saved there is used, or, if there is none yet, the inferred
+        schema is saved there.  Empty strings become None, and values not
+        fitting the schema raise a ``ParseException``.  The schema in use
+        is ``schema``.
+
+        ``skip`` rows are passed over before reading begins.  For an
+        uncompressed ``.csv`` or ``.ndjson`` file, ``index=True`` (or the
+        number of rows between offsets, 1000 by default) records the byte
+        offsets of rows in a sidecar file, ``<filename>.rowidx``, rebuilt
+        when the file changes.  Reading then seeks straight to the rows
+        wanted - by ``skip``, by position (``src[i]``, ``src[i:j]``) or
+        by ``sample`` - instead of parsing those before them.
+
+        ``checkpoint()`` returns a token recording how far reading has got;
+        ``resume_from=token`` carries on from there.  With
+        ``checkpoints=True`` (or when resumed), uncompressed ``.csv`` and
+        ``.ndjson`` files note rows' byte offsets as they are read, and
+        resume from an offset.  SQLAlchemy and MongoDB sources - whose rows
+        then come in primary key (``_id``) order - resume from the last key
+        read; other sources read and discard the rows already read.
+
+        ``shard=(k, n)`` reads only shard ``k`` (counting from 0) of ``n``
+        disjoint shards which together hold every row once, for spreading
+        a source between workers.  Files of a wildcard path are divided
+        between shards; an uncompressed ``.csv`` or ``.ndjson`` file is
+        split into byte ranges at record boundaries; SQLAlchemy tables are
+        divided by primary key, and MongoDB collections by ``_id``.  Other
+        sources are read in full, each shard keeping every ``n``-th row.
+
+        ``prefetch=n`` reads up to about ``n`` rows ahead in a background
+        thread, so that waiting for the network or disk overlaps the work
+        done on each row.  Exceptions raised reading reach the consumer
+        after the rows read before them, and ``close`` stops the thread.
         '''
+        self.stats = SourceStats(src if isinstance(src, str) and len(src) < 256
+                                 else type(src).__name__)
+        self.hooks = list(hooks or [])
+        self.hook_every = hook_every
         self.counter = 0
+        self.table = table
         self.limit = limit
         self.deserializers = []
-        self.table_name = 'Table%d' % (Source.table_count)
+        with Source._table_count_lock:
+            self.table_name = 'Table%d' % (Source.table_count)
+            Source.table_count += 1
         self.fieldnames = fieldnames
+        self.record_tag = record_tag
+        self.row_type = None
+        self.fetch_size = fetch_size
+        self.columns = columns
+        self.where = where
+        self.http_cache = http_cache
+        self.http_status = None
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.from_cache = False
+        self._selected = False
+        self.workers = workers
+        self.ordered = ordered
+        self.pool = pool
         self.db_engine = None
-        Source.table_count += 1
-        if isinstance(src, sqlalchemy.sql.schema.MetaData):
+        self.subsources = None
+        self.generator = None
+        self.file = None
+        self._owns_file = False
+        if row_type not in self.row_types:
+            raise ValueError('row_type must be one of %s' % (self.row_types, ))
+        self.row_type = row_type
+        self._convert_rows = False
+        self.types = types
+        self._typed = None
+        self.prefetch = prefetch
+        self.checkpoints = checkpoints
+        self.index = index
+        self.row_index = None
+        self.skip = skip
+        self._skipped = False
+        self._base = 0  # rows of the data before self.generator's first
+        self._examined = None
+        self._key = None
+        self._last_row = None
+        self._resume = None
+        self._tracked = None
+        if shard is not None:
+            (k, n) = shard
+            if not 0 <= k < n:
+                raise ValueError('shard must be (k, n), with 0 <= k < n')
+            shard = (k, n)
+            self.cache_dir = None  # rows would be cached as the whole file's
+        self.shard = shard
+        self._sharded = False
+        if resume_from is not None:
+            self._resume = self._resumed_state(resume_from, table)
+            self.skip = self._resume['rows']
+            self.cache_dir = None  # not all rows will be read
+        self._read_source(src, table)
+        if shard and not self._sharded:
+            # no way to find the shard's rows at the source
+            self.generator = itertools.islice(self.generator, k, None, n)
+        if self.skip and not self._skipped:
+            deque(itertools.islice(self.generator, self.skip), maxlen=0)
+        self._base += self.skip
+        if types:
+            self._type_rows(types, type_sample)
+        if (columns or where) and not self._selected:
+            if where:  # count the rows ``where`` passes over, for checkpoints
+                self.generator = self._examined = _Counted(self.generator)
+            self.generator = _select_rows(self.generator, where, columns)
+        if row_type:
+            if isinstance(self.generator, _RowReader):
+                self.generator.row_type = row_type
+            elif not self.subsources or types or prefetch:
+                self._convert_rows = True
+        if prefetch:
+            self.generator = _Prefetcher(self.generator, prefetch, self._examined)
+            if self._examined is not None:
+                self._examined = self.generator
+        self.stats.open_seconds = time.perf_counter() - self.stats.started
+
+    def _type_rows(self, types, sample):
+        "Wraps ``self.generator`` to convert values as ``types`` says"
+        (schema, save_to) = (None, None)
+        if isinstance(types, str):
+            if os.path.exists(types):
+                schema = Schema.load(types)
+            else:
+                save_to = types
+        elif isinstance(types, dict):
+            schema = Schema(types)
+        if self.limit:
+            sample = min(sample, self.limit)
+        typed = (_TypedReader if isinstance(self.generator, _RowReader)
+                 else _TypedDicts)
+        self.generator = self._typed = typed(self.generator, schema, sample,
+                                             save_to)
+
+    @property
+    def schema(self):
+        """The ``Schema`` values are converted by (inferring it now, if
+        not yet done), or None if ``types`` was not given"""
+        return self._typed and self._typed.infer()
+
+    def _read_source(self, src, table):
+        "Sets ``self.generator`` according to the type of ``src``"
+        if _instance_of_loaded(src, 'sqlalchemy', 'MetaData'):
             self._source_is_sqlalchemy_metadata(src, table)
             return
-        if isinstance(src, MongoCollection):
+        if _instance_of_loaded(src, 'pymongo', 'collection.Collection') or (
+                hasattr(src, 'find') and hasattr(src, 'full_name')):
             self._source_is_mongo(src)
             return
         if hasattr(src, 'startswith') and (
@@ -465,10 +3085,25 @@ class Source(object):
             return
         try:
             if os.path.isfile(src):
+                if self.index:
+                    self.cache_dir = None  # rows are read from the file
+                if self.cache_dir and self._source_is_cached(src, table):
+                    return
                 if src.endswith('.xls'):
                     self._source_is_excel(src, sheet=table)
+                    self.stats.add_bytes(os.path.getsize(src))
+                elif src.endswith('.xlsx'):
+                    self._source_is_xlsx(src, sheet=table, name=src)
+                    self.stats.add_bytes(os.path.getsize(src))
                 else:
-                    self._source_is_path(src)
+                    self._source_is_path(src, table)
+                if self.cache_dir and not any(
+                        s.limit or s.where or s.columns or s.row_type
+                        for s in self.subsources or ()):
+                    # not when worksheets' rows are cut or reshaped as read
+                    self.generator = self._row_cache.record(
+                        src, self._cache_options(table), self.table_name,
+                        self.generator)
                 return
         except TypeError:
             pass
@@ -485,7 +3120,13 @@ class Source(object):
         try:
             sources = sorted(glob.glob(src))
             if sources:
-                self._multiple_sources(sources)
+                if self.shard:
+                    sources = _shard_files(sources, self.shard)
+                    self._sharded = True
+                if self.workers:
+                    self._parallel_sources(sources)
+                else:
+                    self._multiple_sources(sources)
                 return
         except:
             pass
@@ -504,20 +3145,240 @@ class Source(object):
     def __next__(self):
         self.counter += 1
         if self.limit and (self.counter > self.limit):
+            self.close()
             raise StopIteration
-        return self.generator.__next__()
+        try:
+            row = self.generator.__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        stats = self.stats
+        stats.rows += 1
+        if stats.rows == 1 or (self.hooks and not stats.rows % self.hook_every):
+            self._counted(stats.rows - 1)
+        if self._convert_rows and hasattr(row, 'keys'):
+            row = row_class(self.row_type, tuple(row.keys()))(row.values())
+        self._last_row = row
+        return row
+
+    def _counted(self, before):
+        """Notes the first row's time, and calls the hooks if the row
+        count has passed a multiple of ``hook_every`` since ``before``"""
+        stats = self.stats
+        if not before:
+            stats.first_row_seconds = time.perf_counter() - stats.started
+        if stats.rows // self.hook_every > before // self.hook_every:
+            for hook in self.hooks:
+                hook(stats)
+
+    def _finish(self):
+        if not self.stats.finished:
+            self.stats.ended = time.perf_counter()
+            for hook in self.hooks:
+                hook(self.stats)
+
+    def add_hook(self, hook):
+        """Calls ``hook(self.stats)`` every ``hook_every`` rows, and when
+        the source is exhausted or closed"""
+        self.hooks.append(hook)
+
+    def close(self):
+        """Stops reading: closes the underlying generator, and any file
+        this Source opened itself."""
+        if hasattr(self.generator, 'close'):
+            self.generator.close()
+        for subsource in self.subsources or []:
+            subsource.close()
+        if self._owns_file:
+            self.file.close()
+        self._finish()
+
+    def _indexed(self):
+        if self.row_index is None:
+            raise TypeError('%s: rows are found by position only in .csv and '
+                            '.ndjson files read with index=True'
+                            % self.table_name)
+        return self.row_index
+
+    def _rows_at(self, positions):
+        """The rows at ``positions`` (ascending), counting the file's rows
+        regardless of ``skip`` or ``where``, shaped as this source's rows"""
+        index = self._indexed()
+
+        def rows():
+            (infile, reader, at) = (None, None, None)
+            try:
+                for position in positions:
+                    if infile is None or not at <= position < at + index.every:
+                        if infile:
+                            infile.close()
+                        (infile, reader) = index.open_at(position)
+                        at = position
+                    yield next(itertools.islice(reader, position - at, None))
+                    at = position + 1
+            finally:
+                if infile:
+                    infile.close()
+
+        return list(Source(rows(), row_type=self.row_type, columns=self.columns,
+                           types=self.types and self.schema))
+
+    def __getitem__(self, key):
+        """The row at position ``key`` of an indexed file, or a list of
+        rows for a slice"""
+        rows = self._indexed().rows
+        if isinstance(key, slice):
+            positions = range(*key.indices(rows))
+            if positions.step > 0:
+                return self._rows_at(positions)
+            return self._rows_at(positions[::-1])[::-1]
+        if key < 0:
+            key += rows
+        if not 0 <= key < rows:
+            raise IndexError('%s has %d rows' % (self.table_name, rows))
+        return self._rows_at([key])[0]
+
+    def sample(self, k, seed=None):
+        """A list of ``k`` rows of an indexed file chosen uniformly at
+        random (using ``seed``, if given), in file order"""
+        rows = self._indexed().rows
+        return self._rows_at(sorted(random.Random(seed).sample(range(rows), k)))
+
+    def _consumed(self):
+        "Rows of the data read so far, counting those ``where`` passed over"
+        if self._examined is not None:
+            return self._base + self._examined.count
+        return self._base + self.stats.rows
+
+    def _state(self, consumed):
+        "How to resume reading after ``consumed`` rows of the data"
+        state = {'rows': consumed}
+        if self.subsources is not None:
+            # find the file the row came from, where files' row counts are known
+            rows = consumed - self._base
+            for (n, subsource) in enumerate(self.subsources):
+                if subsource.stats.finished and subsource.stats.rows <= rows:
+                    rows -= subsource.stats.rows
+                    continue
+                # typed or prefetched, rows may have been read ahead of
+                # those consumed
+                part = (subsource._base + rows if self._typed or self.prefetch
+                        else subsource._consumed())
+                state.update(file=self._first_file + n,
+                             part=subsource._state(part))
+                return state
+            state['file'] = self._first_file + len(self.subsources)
+        elif self._tracked:
+            (tracked, reader) = self._tracked
+            for (row, offset) in reversed(list(tracked.anchors)):
+                if row <= consumed:
+                    state.update(offset=offset, after=consumed - row)
+                    if isinstance(reader, _CSVReader):
+                        state['header'] = list(reader.header)
+                    break
+        elif self._key:
+            if self._last_row is not None:
+                row = getattr(self._last_row, '_mapping', self._last_row)
+                state['key'] = OrderedDict((k, row[k]) for k in self._key)
+            elif self._resume and 'key' in self._resume:
+                state['key'] = self._resume['key']  # nothing read since
+        return state
+
+    def checkpoint(self):
+        """
+        Returns a token recording how far reading has got, from which
+        ``Source(..., resume_from=token)`` - with the same source and
+        options - carries on.
+        """
+        checkpoint = {'source': self.stats.source, 'table': self.table,
+                      'shard': self.shard, 'state': self._state(self._consumed())}
+        return base64.urlsafe_b64encode(json.dumps(
+            checkpoint, default=_checkpoint_default).encode('utf8')).decode('ascii')
+
+    def _resumed_state(self, resume_from, table):
+        if isinstance(resume_from, dict):  # part of a wildcard's checkpoint
+            return resume_from
+        checkpoint = json.loads(base64.urlsafe_b64decode(resume_from).decode('utf8'),
+                                object_hook=_checkpoint_value)
+        shard = self.shard and list(self.shard)
+        if ((checkpoint['source'], checkpoint['table'], checkpoint['shard'])
+                != (self.stats.source, table, shard)):
+            raise ValueError(
+                'checkpoint is for %s (table %s, shard %s), not %s (table %s, '
+                'shard %s)' % (checkpoint['source'], checkpoint['table'],
+                               checkpoint['shard'], self.stats.source, table, shard))
+        return checkpoint['state']
+
+    def batches(self, size=1000):
+        """
+        Yields the remaining rows in batches of up to ``size``, each as
+        ``(header, rows)``: a tuple of field names, shared by consecutive
+        batches, and a list of tuples of values in header order.
+
+        CSV, ``.xls`` and SQLAlchemy sources fill batches directly,
+        without building a dict for each row.
+        """
+        if self.subsources and not (self._typed or self.prefetch):
+            batches = (batch for subsource in self.subsources
+                       for batch in subsource.batches(size))
+        elif hasattr(self.generator, 'batches'):
+            batches = self.generator.batches(size)
+        else:
+            batches = _rows_to_batches(self.generator, size)
+        for (header, rows) in batches:
+            if self.limit:
+                rows = rows[:max(self.limit - self.counter, 0)]
+                if not rows:
+                    self.close()
+                    return
+            self.counter += len(rows)
+            self.stats.rows += len(rows)
+            self._last_row = OrderedDict(zip(header, rows[-1]))
+            self._counted(self.stats.rows - len(rows))
+            yield (header, rows)
+        self._finish()
+
+    def column_batches(self, size=1000):
+        """
+        Like ``batches``, but yields each batch as an OrderedDict of
+        columns - NumPy arrays if NumPy is installed, otherwise lists.
+        """
+        for (header, rows) in self.batches(size):
+            yield OrderedDict(zip(header, (_column_array(col)
+                                           for col in zip(*rows))))
 
     def _dump(self, filename):
         all_data = list(self)
         with open(filename, 'w') as outfile:
             outfile.write(pprint.pformat(all_data))
 
-def sqlalchemy_table_sources(url):
-    engine = sqlalchemy.create_engine(url)
-    meta = sqlalchemy.MetaData(bind=engine)
-    meta.reflect()
+_engines = {}
+_reflected_metadata = {}
+_metadata_lock = threading.Lock()
+
+def _sqlalchemy_metadata(url, refresh=False):
+    """Reflected MetaData for the database at ``url``, reusing a single
+    pooled engine and reflection per URL unless ``refresh``."""
+    with _metadata_lock:
+        if refresh or url not in _reflected_metadata:
+            if url not in _engines:
+                _engines[url] = sqlalchemy.create_engine(url)
+            meta = sqlalchemy.MetaData(bind=_engines[url])
+            meta.reflect()
+            _reflected_metadata[url] = meta
+        return _reflected_metadata[url]
+
+def sqlalchemy_table_sources(url, refresh=False, **kwargs):
+    """
+    Yields a Source for each table of the database at ``url``, in
+    the order required by foreign keys.  The engine and reflected
+    table definitions are kept for later calls with the same ``url``;
+    pass ``refresh=True`` to reflect again after schema changes.
+    Other keyword arguments are passed to each ``Source``.
+    """
+    meta = _sqlalchemy_metadata(url, refresh=refresh)
     for table in meta.sorted_tables:
-        yield Source(meta, table=table.name)
+        yield Source(meta, table=table.name, **kwargs)
 
 sqlalchemy_connection_parser = re.compile(r"^(\w+)://")
 
@@ -533,4 +3394,5 @@ if __name__ == '__main__':
                     pass
             pprint.pprint(list(Source(target)))
     else:
+        import doctest
         doctest.testmod(optionflags=doctest.NORMALIZE_WHITESPACE)
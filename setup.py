@@ -36,7 +36,7 @@ setup(
         'Mongo': ['pymongo>=2.7', ],
         'yaml': ['pyyaml>=3.11', ],
         'web': ['requests>=2.3', ],
-        'excel': ['xlrd>=0.9.3', ],
+        'excel': ['xlrd>=0.9.3', 'openpyxl>=2.6', ],
         },
     license="MIT",
     zip_safe=False,
@@ -10,16 +10,28 @@ Tests for `universal_data_loader` module.
 
 import unittest
 import subprocess
+import sys
+import asyncio
+import io
+import json
+import itertools
 from collections import OrderedDict
 import pymongo
+import mongomock
 import datetime
 import os.path
 import time
 import requests
 import tempfile
+import threading
 import sqlite3
+import pickle
+import tracemalloc
+import yaml
+import sqlalchemy
 
 from data_dispenser import sources, sqlalchemy_table_sources
+from data_dispenser import AsyncSource, async_sources
 from tests.file_stems import split_filenames
 
 class TestReadMongo(unittest.TestCase):
@@ -42,6 +54,38 @@ class TestReadMongo(unittest.TestCase):
         self.tbl.drop()
 
 
+class TestMongoQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.tbl = mongomock.MongoClient().test_db.knights
+        self.tbl.insert_many([{'name': 'Lancelot', 'brave': True, 'kg': 82},
+                              {'name': 'Robin', 'brave': False},
+                              {'name': 'Gawain', 'brave': True, 'kg': 69.2}])
+
+    def test_pushdown(self):
+        src = sources.Source(self.tbl, limit=1, columns=['name'],
+                             where={'brave': True})
+        # the limit is imposed by the query, not only by the Source
+        self.assertEqual(list(src.generator), [{'name': 'Lancelot'}])
+        src = sources.Source(self.tbl, columns=['kg', 'name'],
+                             where={'brave': True})
+        self.assertEqual([r['kg'] for r in src], [82, 69.2])
+
+    def test_resume(self):
+        src = sources.Source(self.tbl, columns=['_id', 'name'])
+        self.assertEqual(next(src)['name'], 'Lancelot')
+        self.tbl.insert_one({'name': 'Galahad'})
+        src = sources.Source(self.tbl, columns=['_id', 'name'],
+                             resume_from=src.checkpoint())
+        self.assertEqual([r['name'] for r in src], ['Robin', 'Gawain', 'Galahad'])
+
+    def test_shard(self):
+        names = [[r['name'] for r in sources.Source(self.tbl, shard=(k, 2))]
+                 for k in range(2)]
+        self.assertEqual(sorted(sum(names, [])), ['Gawain', 'Lancelot', 'Robin'])
+        self.assertTrue(all(names))
+
+
 def expectations():
     for (filename, stem, ext) in split_filenames():
         print("\n\n\nTesting %s\n***********\n\n\n" % filename)
@@ -67,11 +111,11 @@ class TestURLreader(unittest.TestCase):
     def tearDown(self):
         self.webserver.terminate()
 
-    def keep_trying(self, url):
+    def keep_trying(self, url, **kwargs):
         # local test webserver doesn't like being overtasked.
         for tries in range(5):
             try:
-                src = sources.Source(url)
+                src = sources.Source(url, **kwargs)
                 return src
             except requests.exceptions.ConnectionError as e:
                 if "Max retries exceeded" not in str(e):
@@ -90,6 +134,73 @@ class TestURLreader(unittest.TestCase):
                                  msg="%s, from local webserver" % filename)
 
 
+    def test_http_cache(self):
+        with open(here('animals.result')) as infile:
+            expectation = eval(infile.read())
+        url = "http://127.0.0.1:8000/animals.csv"
+        with tempfile.TemporaryDirectory() as cache_dir:
+            src = self.keep_trying(url, http_cache=cache_dir)
+            self.assertEqual(src.http_status, 200)
+            self.assertEqual(list(src), expectation)
+            src = self.keep_trying(url, http_cache=cache_dir)
+            self.assertEqual(src.http_status, 304)
+            self.assertEqual(list(src), expectation)
+
+    def test_guess_encoding(self):
+        self.assertEqual(sources._guess_encoding('naïve café, déjà vu'.encode('utf-8')),
+                         'utf-8')
+        detectors = (sources.charset_normalizer, sources.chardet)
+        sources.charset_normalizer = sources.chardet = sources._OptionalModule(
+            'no_such_module', 'cannot guess')
+        try:
+            self.assertIsNone(sources._guess_encoding(b'abc'))
+        finally:
+            (sources.charset_normalizer, sources.chardet) = detectors
+
+    def test_async(self):
+        expected = dict(("http://127.0.0.1:8000/%s" % filename, expectation)
+                        for (filename, stem, ext, expectation) in expectations()
+                        if '#' not in filename)
+        self.keep_trying(list(expected)[0])  # wait for webserver
+
+        async def read_all():
+            results = dict((url, []) for url in expected)
+            async for (url, row) in async_sources(expected, concurrency=3):
+                results[url].append(row)
+            return results
+
+        self.assertEqual(asyncio.run(read_all()), expected)
+
+
+class TestAsyncSource(unittest.TestCase):
+
+    def test_rows(self):
+        async def read(**kwargs):
+            return [row async for row in AsyncSource(here('menu.json'),
+                                                     batch_size=2, **kwargs)]
+        with open(here('menu.result')) as infile:
+            expectation = eval(infile.read())
+        self.assertEqual(asyncio.run(read()), expectation)
+        self.assertEqual(asyncio.run(read(limit=1)), expectation[:1])
+
+    def test_errors(self):
+        async def read():
+            async for (src, row) in async_sources([here('menu.json')],
+                                                  row_type='frozenset'):
+                pass
+        self.assertRaises(ValueError, asyncio.run, read())
+
+    def test_closes_early(self):
+        async def read():
+            endless = [({'n': n} for n in itertools.count()) for i in range(3)]
+            rows = async_sources(endless, batch_size=2, prefetch=2)
+            async for (src, row) in rows:
+                break
+            await rows.aclose()
+            return [t for t in threading.enumerate() if '_read_ahead' in t.name]
+        self.assertEqual(asyncio.run(read()), [])
+
+
 class Test_Sqlite(unittest.TestCase):
 
     def setUp(self):
@@ -118,6 +229,718 @@ class Test_Sqlite(unittest.TestCase):
             result = list(tbl)
             self.assertIn('Reepacheep', [r.name for r in result])
 
+    def test_streaming_and_reuse(self):
+        url = 'sqlite:///%s' % self.db.name
+        (tbl, ) = sqlalchemy_table_sources(url, fetch_size=3)
+        self.assertEqual(len(list(tbl)), 4)
+        self.assertIsNone(tbl.generator.connection)  # returned to pool
+        (again, ) = sqlalchemy_table_sources(url)
+        self.assertIs(again.db_engine, tbl.db_engine)
+        again.generator.close()
+        self.assertIs(sources._sqlalchemy_metadata(url),
+                      sources._sqlalchemy_metadata(url))
+        self.cursor.execute("CREATE TABLE squires (name VARCHAR(10))")
+        self.conn.commit()
+        self.assertEqual(len(list(sqlalchemy_table_sources(url))), 1)
+        self.assertEqual(len(list(sqlalchemy_table_sources(url, refresh=True))), 2)
+
+    def test_pushdown(self):
+        url = 'sqlite:///%s' % self.db.name
+        meta = sources._sqlalchemy_metadata(url)
+        statements = []
+        def remember(conn, cursor, statement, *args):
+            statements.append(statement)
+        sqlalchemy.event.listen(meta.bind, 'before_cursor_execute', remember)
+        try:
+            src = sources.Source(meta, table='knights', limit=2,
+                                 columns=['name', 'kg'], where={'brave': 1})
+            self.assertEqual([(r.name, float(r.kg)) for r in src],
+                             [('Lancelot', 82), ('Gawain', 69.2)])
+        finally:
+            sqlalchemy.event.remove(meta.bind, 'before_cursor_execute', remember)
+        self.assertIn('WHERE knights.brave =', statements[-1])
+        self.assertIn('LIMIT', statements[-1])
+        self.assertNotIn('dob', statements[-1])
+
+    def test_batches(self):
+        for tbl in sqlalchemy_table_sources('sqlite:///%s' % self.db.name):
+            batches = list(tbl.batches(3))
+            self.assertEqual([len(rows) for (header, rows) in batches], [3, 1])
+            self.assertEqual(batches[0][0], ('name', 'dob', 'kg', 'brave'))
+            self.assertEqual(batches[1][1][0][0], 'Reepacheep')
+
+    def test_resume(self):
+        self.cursor.execute("CREATE TABLE squires (id INTEGER PRIMARY KEY, name VARCHAR(10))")
+        self.cursor.executemany("INSERT INTO squires VALUES (?, ?)",
+                                [(3, 'Patsy'), (1, 'Bors'), (2, 'Concorde')])
+        self.conn.commit()
+        meta = sources._sqlalchemy_metadata('sqlite:///%s' % self.db.name,
+                                            refresh=True)
+        src = sources.Source(meta, table='squires')
+        self.assertEqual(next(src).name, 'Bors')  # in key order
+        token = src.checkpoint()
+        self.cursor.execute("DELETE FROM squires WHERE id = 1")
+        self.conn.commit()
+        # resumes after the last key read, not after a count of rows
+        src = sources.Source(meta, table='squires', resume_from=token)
+        self.assertEqual([r.name for r in src], ['Concorde', 'Patsy'])
+        # without a primary key, by offset
+        src = sources.Source(meta, table='knights')
+        next(src)
+        src = sources.Source(meta, table='knights', resume_from=src.checkpoint())
+        self.assertEqual(len(list(src)), 3)
+
+    def test_shard(self):
+        self.cursor.execute("CREATE TABLE squires (id INTEGER PRIMARY KEY, name VARCHAR(10))")
+        self.cursor.executemany("INSERT INTO squires VALUES (?, ?)",
+                                [(n, 'squire %d' % n) for n in range(-5, 10)])
+        self.cursor.execute("CREATE TABLE horses (name VARCHAR(10) PRIMARY KEY)")
+        self.cursor.executemany("INSERT INTO horses VALUES (?)",
+                                [(name, ) for name in 'abcdefg'])
+        self.conn.commit()
+        meta = sources._sqlalchemy_metadata('sqlite:///%s' % self.db.name,
+                                            refresh=True)
+        for (table, total) in (('squires', 15), ('horses', 7), ('knights', 4)):
+            shards = [list(sources.Source(meta, table=table, shard=(k, 3)))
+                      for k in range(3)]
+            self.assertEqual(sorted(len(rows) for rows in shards),
+                             [total // 3] * (3 - total % 3)
+                             + [total // 3 + 1] * (total % 3), msg=table)
+            self.assertEqual(len(set(sum(shards, []))), total)
+
+    def test_prefetch(self):
+        # SQLite connections work only on the thread that opened them
+        meta = sources._sqlalchemy_metadata('sqlite:///%s' % self.db.name)
+        src = sources.Source(meta, table='knights', prefetch=2,
+                             row_type='namedtuple')
+        self.assertEqual([r.name for r in src],
+                         ['Lancelot', 'Gawain', 'Robin', 'Reepacheep'])
+        src = sources.Source(meta, table='knights', prefetch=1)
+        next(src)
+        src.close()
+        self.assertFalse(src.generator._thread.is_alive())
+
+
+class TestStreamingJSON(unittest.TestCase):
+
+    def setUp(self):
+        self.chunk_size = sources._JSONStream.chunk_size
+        sources._JSONStream.chunk_size = 7  # force values across chunks
+
+    def tearDown(self):
+        sources._JSONStream.chunk_size = self.chunk_size
+
+    def load(self, text):
+        return list(sources.json_loader(io.StringIO(text)))
+
+    def test_array_across_chunks(self):
+        with open(here('menu.json')) as infile:
+            text = infile.read()
+        self.assertEqual(self.load(text), json.loads(text))
+        self.assertEqual(self.load('[12345, 678.9, true, "a,b"]'),
+                         [12345, 678.9, True, "a,b"])
+
+    def test_numbers_across_chunks(self):
+        numbers = [1.5, -2.25e-3, 1e+22, -0.125, 31.0, 2.5e10, -7, 0.0625]
+        for start in range(8):  # each way of cutting them into chunks
+            text = ' ' * start + json.dumps(numbers)
+            self.assertEqual(self.load(text), numbers)
+            text = ' ' * start + json.dumps({'a': numbers[1], 'b': numbers[2],
+                                             'c': numbers[0]})
+            self.assertEqual(self.load(text), [{'a': numbers[1],
+                                                'b': numbers[2],
+                                                'c': numbers[0]}])
+
+    def test_first_nested_array(self):
+        text = '{"meta": {"count": 2}, "rows": [{"a": 1}, {"a": 2}], "x": 1}'
+        self.assertEqual(self.load(text), [{"a": 1}, {"a": 2}])
+
+    def test_objects(self):
+        self.assertEqual(self.load('{"a": 1, "b": [1, 2]}'),
+                         [{"a": 1, "b": [1, 2]}])
+        self.assertEqual(self.load('{"x": {"a": 1}, "y": {"a": 2}}'),
+                         [{"a": 1, "name_": "x"}, {"a": 2, "name_": "y"}])
+        self.assertEqual(self.load('{"a": 1}\n{"a": 2}\n'),
+                         [{"a": 1}, {"a": 2}])
+
+    def test_not_json(self):
+        with open(here('animals.csv')) as infile:
+            self.assertRaises(ValueError, list, sources.json_loader(infile))
+
+
+class TestStreamingXML(unittest.TestCase):
+
+    def test_record_tag(self):
+        src = sources.Source(here('countries.xml'), record_tag='neighbor')
+        self.assertEqual([r['name'] for r in src],
+                         ['Austria', 'Switzerland', 'Malaysia',
+                          'Costa Rica', 'Colombia'])
+        src = sources.Source(here('countries.xml'),
+                             record_tag='/data/country')
+        self.assertEqual([r['name'] for r in src],
+                         ['Liechtenstein', 'Singapore', 'Panama'])
+
+    def test_nested_records(self):
+        xml = ('<report><meta><author>me</author></meta><rows>' +
+               ''.join('<row id="%d"><v>%d</v><v>0</v></row>' % (i, i)
+                       for i in range(3000)) +
+               '</rows></report>')
+        rows = list(sources._eval_xml(io.StringIO(xml)))
+        self.assertEqual(len(rows), 3000)
+        self.assertEqual(rows[-1], OrderedDict([('tag', 'row'), ('id', '2999'),
+                                                ('v', ['2999', '0'])]))
+
+    def test_first_list(self):
+        # as the whole document was once searched, depth first
+        for (xml, expected) in (
+                ('<root><a><b><c>1</c><c>2</c></b></a>'
+                 '<d><e>x</e><e>y</e></d></root>', ['1', '2']),
+                ('<root><a>1</a><b>2</b><b>3</b><a>4</a></root>', ['1', '4'])):
+            self.assertEqual(list(sources._eval_xml(io.StringIO(xml))), expected)
+
+    def test_stops_after_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'report.xml')
+            with open(path, 'w') as outfile:
+                outfile.write('<report><meta><m>1</m><m>2</m></meta><rows>' +
+                              '<row><v>0</v></row>' * 100000 + '</rows></report>')
+            with open(path) as infile:
+                self.assertEqual(list(sources._eval_xml(infile)), ['1', '2'])
+                self.assertLess(infile.tell(), os.path.getsize(path) / 4)
+
+
+class TestImportCost(unittest.TestCase):
+
+    optional = ('yaml', 'requests', 'xlrd', 'openpyxl', 'bs4', 'sqlalchemy',
+                'pymongo', 'numpy', 'asyncio', 'charset_normalizer', 'chardet')
+
+    def test_optional_imports(self):
+        # importing every optional dependency took over 0.5s
+        script = ("import sys, data_dispenser\n"
+                  "print(' '.join(m for m in %r if m in sys.modules))\n"
+                  "list(data_dispenser.Source(%r))\n"
+                  "print(' '.join(m for m in %r if m in sys.modules))"
+                  % (self.optional, here('animals.csv'), self.optional))
+        result = subprocess.run([sys.executable, '-c', script],
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.splitlines(), ['', ''],
+                         'optional dependencies imported to import, or read CSV')
+
+    def test_missing_module(self):
+        missing = sources._OptionalModule('no_such_module', 'will not work')
+        self.assertFalse(missing)
+        self.assertFalse(hasattr(missing, '__wrapped__'))
+        self.assertRaises(ImportError, getattr, missing, 'load')
+
+
+class TestStats(unittest.TestCase):
+
+    def test_file(self):
+        calls = []
+        src = sources.Source(here('animals.csv'), hooks=[calls.append],
+                             hook_every=2)
+        self.assertEqual(src.stats.deserializers[0][0], '_eval_csv')
+        self.assertEqual(len(list(src)), 3)
+        self.assertEqual(src.stats.rows, 3)
+        self.assertEqual(src.stats.bytes_read, os.path.getsize(here('animals.csv')))
+        self.assertTrue(src.stats.finished)
+        self.assertLessEqual(src.stats.first_row_seconds, src.stats.elapsed)
+        # after 2 rows, and at the end
+        self.assertEqual(len(calls), 2)
+        self.assertIs(calls[0], src.stats)
+
+    def test_sniffing_and_limit(self):
+        with open(here('knights.yaml')) as infile:
+            src = sources.Source(infile, limit=1)
+            tried = [name for (name, seconds, outcome) in src.stats.deserializers]
+            self.assertEqual(tried[-1], 'ordered_yaml_load')
+            self.assertEqual(src.stats.deserializers[-1][2], 'ok')
+            finished = []
+            src.add_hook(finished.append)
+            list(src)
+        self.assertEqual(src.stats.rows, 1)
+        self.assertEqual(len(finished), 1)
+
+    def test_glob(self):
+        src = sources.Source(here('*.json'))
+        list(src)
+        self.assertEqual(src.stats.bytes_read,
+                         sum(os.path.getsize(here(f))
+                             for f in ('menu.json', 'solarsystem.json')))
+        self.assertEqual(len(src.stats.parts), 2)
+        self.assertIn('rows_per_second', src.stats.as_dict())
+
+
+class TestTypes(unittest.TestCase):
+
+    data = ('id,code,amount,day,at,flag,note\n'
+            '1,007,1.5,2020-01-31,2020-01-31 12:30:00,true,x\n'
+            '2,010,,2020-02-01,2020-02-01T08:00,False,\n')
+
+    def test_inferred(self):
+        src = sources.Source(io.StringIO(self.data), types=True)
+        self.assertEqual(src.schema, sources.Schema([
+            ('id', 'int'), ('code', 'str'), ('amount', 'float'),
+            ('day', 'date'), ('at', 'datetime'), ('flag', 'bool'),
+            ('note', 'str')]))
+        rows = list(src)
+        self.assertEqual(rows[0]['day'], datetime.date(2020, 1, 31))
+        self.assertEqual(rows[1]['at'], datetime.datetime(2020, 2, 1, 8))
+        self.assertEqual(list(rows[1].values()),
+                         [2, '010', None, datetime.date(2020, 2, 1),
+                          datetime.datetime(2020, 2, 1, 8), False, ''])
+
+    def test_persisted(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'animals.schema.json')
+            rows = list(sources.Source(here('animals.csv'), types=path))
+            self.assertEqual(sources.Schema.load(path)['kg'], 'float')
+            sources.Schema(kg='int').save(path)
+            src = sources.Source(here('animals.csv'), types=path)
+            self.assertRaises(sources.ParseException, list, src)
+        self.assertEqual([row['kg'] for row in rows], [22, 312.7, 0.3])
+        self.assertRaises(ValueError, sources.Schema, kg='number')
+
+    def test_batches_and_selection(self):
+        src = sources.Source(here('animals.csv'), types={'kg': 'float'},
+                             where={'kg': 22}, row_type='tuple')
+        self.assertEqual(list(src), [('Alfred', 'wart hog', 22.0, 'loves turnips')])
+        (header, rows) = next(sources.Source(here('*.csv'), types=True,
+                                             limit=2).batches())
+        self.assertEqual(rows[1], ('Gertrude', 'polar bear', 312.7, 'deep thinker'))
+
+    def test_xml(self):
+        src = sources.Source(here('countries.xml'), types=True)
+        self.assertEqual(src.schema['rank'], 'int')
+        self.assertEqual([row['year'] for row in src], [2008, 2011, 2011])
+
+
+class TestRowIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'numbers.csv')
+        with open(self.path, 'w') as outfile:
+            outfile.write('n,note\n')
+            for n in range(100):
+                outfile.write('%d,"line\nbreak"\n\n' % n if n % 7 == 0
+                              else '%d,\n' % n)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_positions(self):
+        src = sources.Source(self.path, index=10, row_type='tuple')
+        self.assertTrue(os.path.exists(self.path + '.rowidx'))
+        self.assertEqual(src.row_index.rows, 100)
+        self.assertEqual(src[21], ('21', 'line\nbreak'))
+        self.assertEqual(src[-1]['n'], '99')
+        self.assertEqual([row['n'] for row in src[95:]], ['95', '96', '97', '98', '99'])
+        self.assertEqual([row['n'] for row in src[30:0:-10]], ['30', '20', '10'])
+        self.assertRaises(IndexError, src.__getitem__, 100)
+        sample = src.sample(10, seed=3)
+        self.assertEqual(sample, sorted(sample, key=lambda row: int(row['n'])))
+        self.assertEqual(len(set(sample)), 10)
+        # iteration is not disturbed
+        self.assertEqual(len(list(src)), 100)
+
+    def test_skip(self):
+        indexed = sources.Source(self.path, index=10, skip=42)
+        self.assertEqual(next(indexed)['n'], '42')
+        self.assertLess(indexed.stats.bytes_read, os.path.getsize(self.path))
+        scanned = sources.Source(self.path, skip=42, limit=3)
+        self.assertEqual([row['n'] for row in scanned], ['42', '43', '44'])
+        self.assertEqual(list(sources.Source(self.path, index=10, skip=100)), [])
+        self.assertRaises(TypeError, scanned.__getitem__, 0)
+
+    def test_rebuilt_when_changed(self):
+        self.assertEqual(sources.Source(self.path, index=True).row_index.rows, 100)
+        with open(self.path, 'a') as outfile:
+            outfile.write('100,\n')
+        src = sources.Source(self.path, index=True)
+        self.assertEqual(src[-1]['n'], '100')
+        ndjson = os.path.join(self.tmpdir.name, 'menu.ndjson')
+        with open(here('menu.ndjson')) as infile, open(ndjson, 'w') as outfile:
+            outfile.write(infile.read())
+        self.assertEqual(sources.Source(ndjson, index=True)[2]['name'], 'nuts')
+
+    def test_line_endings(self):
+        cr = os.path.join(self.tmpdir.name, 'cr.csv')
+        with open(self.path, newline='') as infile, \
+                open(cr, 'w', newline='') as outfile:
+            outfile.write(infile.read().replace('\n', '\r'))
+        src = sources.Source(cr, index=10, row_type='tuple')
+        self.assertEqual(src.row_index.rows, 100)
+        rows = list(sources.Source(cr, row_type='tuple'))
+        self.assertEqual(src[21], rows[21])
+        self.assertEqual(list(src), rows)
+        self.assertEqual(next(sources.Source(cr, index=10, skip=42))['n'], '42')
+        ndjson = os.path.join(self.tmpdir.name, 'menu.ndjson')
+        with open(here('menu.ndjson')) as infile, \
+                open(ndjson, 'w', newline='\r') as outfile:
+            outfile.write(infile.read())
+        self.assertEqual(sources.Source(ndjson, index=True)[2]['name'], 'nuts')
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'numbers.csv')
+        with open(self.path, 'w') as outfile:
+            outfile.write('n,note\n')
+            for n in range(2500):
+                outfile.write('%d,"a\nb"\n\n' % n if n % 7 == 0 else '%d,\n' % n)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self, src, count, **kwargs):
+        "Reads ``count`` rows, then the rest, resumed from a checkpoint"
+        source = sources.Source(src, **kwargs)
+        rows = [row for (_, row) in zip(range(count), source)]
+        token = source.checkpoint()
+        source.close()
+        resumed = sources.Source(src, resume_from=token, **kwargs)
+        return (rows + list(resumed), resumed)
+
+    def test_csv(self):
+        (rows, resumed) = self.read(self.path, 2345, checkpoints=True)
+        self.assertEqual([row['n'] for row in rows], [str(n) for n in range(2500)])
+        self.assertEqual(rows[7]['note'], 'a\nb')
+        # from the offset of row 2000, not the start of the file
+        self.assertLess(resumed.stats.bytes_read, os.path.getsize(self.path) / 4)
+        (rows, resumed) = self.read(self.path, 100, where={'note': 'a\nb'},
+                                    types=True, checkpoints=True)
+        self.assertEqual([row['n'] for row in rows], list(range(0, 2500, 7)))
+        # offsets are noted only when wanted; otherwise, resuming counts rows
+        source = sources.Source(self.path)
+        next(source)
+        self.assertIsNone(source._tracked)
+        (rows, resumed) = self.read(self.path, 2345)
+        self.assertEqual([row['n'] for row in rows], [str(n) for n in range(2500)])
+
+    def test_line_endings(self):
+        # old Mac (CR only) and mixed line endings, as universal newlines
+        for (name, data) in (('cr.csv', b'n,note\r1,a\r2,"b\rc"\r\r3,d\r'),
+                             ('mixed.csv', b'n,note\r\n1,a\n2,"b\rc"\r3,d')):
+            path = os.path.join(self.tmpdir.name, name)
+            with open(path, 'wb') as outfile:
+                outfile.write(data)
+            (rows, resumed) = self.read(path, 1)
+            self.assertEqual([tuple(row.values()) for row in rows],
+                             [('1', 'a'), ('2', 'b\nc'), ('3', 'd')], msg=name)
+
+    def test_other_sources(self):
+        for (src, count) in ((here('menu.json'), 1), (here('menu.ndjson'), 2),
+                             (here('*.csv'), 5)):
+            (rows, resumed) = self.read(src, count)
+            self.assertEqual(rows, list(sources.Source(src)), msg=src)
+        token = sources.Source(here('menu.json')).checkpoint()
+        self.assertRaises(ValueError, sources.Source, here('menu.ndjson'),
+                          resume_from=token)
+
+    def test_prefetch(self):
+        # read ahead, but resumed after the rows consumed
+        (rows, resumed) = self.read(self.path, 1234, prefetch=500)
+        self.assertEqual([row['n'] for row in rows], [str(n) for n in range(2500)])
+        (rows, resumed) = self.read(self.path, 100, where={'note': 'a\nb'},
+                                    prefetch=50)
+        self.assertEqual([row['n'] for row in rows], [str(n) for n in range(0, 2500, 7)])
+        (rows, resumed) = self.read(here('*.csv'), 5, prefetch=2)
+        self.assertEqual(rows, list(sources.Source(here('*.csv'))))
+
+
+class TestShard(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'numbers.csv')
+        with open(self.path, 'w') as outfile:
+            outfile.write('n,note\n')
+            for n in range(2500):
+                outfile.write('%d,"a\nb"\n' % n if n % 7 == 0 else '%d,\n' % n)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def shards(self, src, n, **kwargs):
+        return [list(sources.Source(src, shard=(k, n), **kwargs))
+                for k in range(n)]
+
+    def test_csv(self):
+        shards = self.shards(self.path, 3)
+        # each shard reads its own byte range, starting at a record
+        self.assertTrue(all(700 < len(rows) < 1000 for rows in shards))
+        self.assertEqual([row['n'] for rows in shards for row in rows],
+                         [str(n) for n in range(2500)])
+        self.assertEqual(shards[0][7]['note'], 'a\nb')
+
+    def test_line_endings(self):
+        path = os.path.join(self.tmpdir.name, 'cr.csv')
+        with open(self.path, newline='') as infile, \
+                open(path, 'w', newline='') as outfile:
+            outfile.write(infile.read().replace('\n', '\r'))
+        shards = self.shards(path, 3)
+        self.assertTrue(all(shards))
+        self.assertEqual([row for rows in shards for row in rows],
+                         list(sources.Source(path)))
+        self.assertEqual(len(list(sources.Source(path))), 2500)
+
+    def test_other_sources(self):
+        for (src, n) in ((here('*.csv'), 2), (here('menu.ndjson'), 2),
+                         (here('menu.json'), 2), (here('naics_codes.csv'), 9)):
+            rows = [row for rows in self.shards(src, n) for row in rows]
+            self.assertEqual(sorted(map(repr, rows)),
+                             sorted(map(repr, sources.Source(src))), msg=src)
+
+    def test_checkpoint(self):
+        src = sources.Source(self.path, shard=(1, 2))
+        first = next(src)
+        token = src.checkpoint()
+        rest = list(sources.Source(self.path, shard=(1, 2), resume_from=token))
+        self.assertEqual([first] + rest, self.shards(self.path, 2)[1])
+        self.assertRaises(ValueError, sources.Source, self.path,
+                          shard=(0, 2), resume_from=token)
+        self.assertRaises(ValueError, sources.Source, self.path, shard=(2, 2))
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_same_rows(self):
+        for (src, kwargs) in ((here('animals.csv'), {'row_type': 'namedtuple'}),
+                              (here('menu.json'), {}),
+                              (here('*.csv'), {'where': {'name': 'Lancelot'}}),
+                              (here('*.csv'), {'columns': ['name'],
+                                               'row_type': 'tuple'})):
+            self.assertEqual(list(sources.Source(src, prefetch=2, **kwargs)),
+                             list(sources.Source(src, **kwargs)), msg=src)
+
+    def test_exceptions_and_close(self):
+        def rows():
+            yield {'n': 1}
+            yield {'n': 2}
+            raise KeyError('n')
+        src = sources.Source(rows(), prefetch=10)
+        (first, second) = (next(src), next(src))  # before the exception
+        self.assertEqual(second, {'n': 2})
+        self.assertRaises(KeyError, next, src)
+
+        def endless():
+            n = 0
+            while True:
+                n += 1
+                yield {'n': n}
+        src = sources.Source(endless(), prefetch=100)
+        self.assertEqual(next(src), {'n': 1})
+        src.close()
+        self.assertFalse(src.generator._thread.is_alive())
+        self.assertRaises(StopIteration, next, src)
+
+    def test_base_exceptions(self):
+        def rows():
+            yield {'n': 1}
+            raise SystemExit(3)
+        src = sources.Source(rows(), prefetch=10)
+        raised = []
+        def read():
+            try:
+                list(src)
+            except SystemExit as e:
+                raised.append(e.code)
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(5)
+        self.assertEqual(raised, [3], 'left waiting for rows')
+
+    def test_threads_share_state(self):
+        names = []
+        def make_sources():
+            names.extend(sources.Source(iter([{'a': 1}])).table_name
+                         for _ in range(200))
+        threads = [threading.Thread(target=make_sources) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(names)), 800)
+
+
+class TestStreamingYAML(unittest.TestCase):
+
+    def test_documents(self):
+        stream = "name: Robin\nbrave: no\n---\n- name: Lancelot\n- name: Gawain\n"
+        self.assertEqual(list(sources.ordered_yaml_load(stream)),
+                         [OrderedDict([('name', 'Robin'), ('brave', False)]),
+                          OrderedDict([('name', 'Lancelot')]),
+                          OrderedDict([('name', 'Gawain')])])
+
+    def test_lazy(self):
+        # a later document's error is met only when reading reaches it
+        rows = sources.ordered_yaml_load("name: Robin\n---\nkey: [unclosed\n")
+        self.assertEqual(next(rows), OrderedDict([('name', 'Robin')]))
+        self.assertRaises(yaml.YAMLError, next, rows)
+
+    def test_loader_built_once(self):
+        with open(here('knights.yaml')) as infile:
+            list(sources.ordered_yaml_load(infile))
+        misses = sources._ordered_loader.cache_info().misses
+        with open(here('knights.yaml')) as infile:
+            list(sources.ordered_yaml_load(infile))
+        self.assertEqual(sources._ordered_loader.cache_info().misses, misses)
+
+
+class TestSniffing(unittest.TestCase):
+
+    def test_likeliest_deserializer_first(self):
+        for (filename, deserializer) in (('animals.csv', sources._eval_csv),
+                                         ('menu.json', sources.json_loader),
+                                         ('countries.xml', sources._eval_xml),
+                                         ('knights.yaml', sources.ordered_yaml_load)):
+            with open(here(filename)) as infile:
+                src = sources.Source(infile)
+                self.assertIs(src.deserializers[0], deserializer)
+                self.assertIs(src.deserializer, deserializer)
+
+    def test_first_row_not_reparsed(self):
+        calls = []
+        def counting_csv(target, *args, **kwargs):
+            calls.append(target)
+            return sources._eval_csv(target, *args, **kwargs)
+        with open(here('animals.csv')) as infile:
+            src = sources.Source(infile)
+            src.deserializers = [counting_csv, ]
+            src._deserialize(infile)
+            self.assertEqual(len(list(src)), 3)
+        self.assertEqual(len(calls), 1)
+
+
+class TestEarlyTermination(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        rows = [OrderedDict([('id', i), ('name', 'row %d' % i), ('kg', i / 3.0)])
+                for i in range(2000)]
+        with open(os.path.join(self.dir.name, 'big.yaml'), 'w') as outfile:
+            yaml.dump([dict(r) for r in rows[:1000]], outfile)
+        with open(os.path.join(self.dir.name, 'big.json'), 'w') as outfile:
+            json.dump(rows * 5, outfile)
+        with open(os.path.join(self.dir.name, 'big.xml'), 'w') as outfile:
+            outfile.write('<rows>%s</rows>' % ''.join(
+                '<row id="%(id)d"><name>%(name)s</name></row>' % r
+                for r in rows * 5))
+        with open(os.path.join(self.dir.name, 'big.pickle'), 'wb') as outfile:
+            for row in rows * 2:
+                pickle.dump(row, outfile)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def measure(self, filename, limit):
+        tracemalloc.start()
+        src = sources.Source(os.path.join(self.dir.name, filename), limit=limit)
+        rows = list(src)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return (rows, src.stats.bytes_read, peak)
+
+    def test_limit_stops_parsing(self):
+        for filename in ('big.yaml', 'big.json', 'big.xml', 'big.pickle'):
+            (all_rows, all_read, all_peak) = self.measure(filename, None)
+            (rows, limited_read, limited_peak) = self.measure(filename, 5)
+            self.assertEqual(rows, all_rows[:5])
+            self.assertEqual(all_read, os.path.getsize(
+                os.path.join(self.dir.name, filename)))
+            # reading stopped well before the end of the file
+            self.assertLess(limited_read * 2, all_read, filename)
+            self.assertLess(limited_peak * 10, all_peak, filename)
+
+
+class TestRowCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.dir.name, 'cache')
+        self.filename = os.path.join(self.dir.name, 'states.yaml')
+        with open(here('states.yaml')) as infile:
+            self.text = infile.read()
+        with open(self.filename, 'w') as outfile:
+            outfile.write(self.text)
+        with open(here('states.result')) as infile:
+            self.expectation = eval(infile.read())
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def read(self, filename, **kwargs):
+        src = sources.Source(filename, cache_dir=self.cache_dir, **kwargs)
+        return (src, list(src))
+
+    def test_replay(self):
+        (src, rows) = self.read(self.filename)
+        self.assertFalse(src.from_cache)
+        (src, cached_rows) = self.read(self.filename)
+        self.assertTrue(src.from_cache)
+        self.assertEqual(cached_rows, self.expectation)
+        self.assertEqual(src.table_name, 'states')
+        (src, rows) = self.read(here('federal_budgets.xls'))
+        (src, cached_rows) = self.read(here('federal_budgets.xls'))
+        self.assertTrue(src.from_cache)
+        self.assertEqual(cached_rows, rows)
+
+    def test_limited_worksheets(self):
+        budgets = here('federal_budgets.xls')
+        all_rows = list(sources.Source(budgets))
+        for (n, kwargs) in enumerate(({'limit': 2},
+                                      {'where': {'Year': '1789–1849'}},
+                                      {'columns': ['Year']},
+                                      {'row_type': 'tuple'})):
+            self.cache_dir = os.path.join(self.dir.name, 'cache%d' % n)
+            expectation = list(sources.Source(budgets, **kwargs))
+            self.assertEqual(self.read(budgets, **kwargs)[1], expectation)
+            self.assertEqual(self.read(budgets)[1], all_rows, msg=kwargs)
+            (src, rows) = self.read(budgets, **kwargs)
+            self.assertTrue(src.from_cache)
+            self.assertEqual(rows, expectation, msg=kwargs)
+
+    def test_invalidation_and_eviction(self):
+        self.read(self.filename)
+        with open(self.filename, 'a') as outfile:
+            outfile.write('- state: Ohio\n  capital: Columbus\n')
+        (src, rows) = self.read(self.filename)
+        self.assertFalse(src.from_cache)
+        self.assertEqual(len(rows), len(self.expectation) + 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        (src, rows) = self.read(self.filename, limit=1)
+        self.read(here('animals.csv'), cache_size=1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 0)
+
+    def test_unpicklable(self):
+        def rows():
+            for n in range(10000):
+                yield {'n': n, 'f': (lambda: n) if n == 1500 else None}
+        cache = sources._RowCache(self.cache_dir, 2**30)
+        records = cache.record(self.filename, (), 'states', rows())
+        self.assertEqual(sum(1 for row in itertools.islice(records, 5000)), 5000)
+        # rows after the failure are passed on, not kept for the cache
+        self.assertFalse(records.gi_frame.f_locals['batch'])
+        self.assertEqual(sum(1 for row in records), 5000)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_concurrent_writers(self):
+        # as from two threads caching the same file at once
+        rows = [{'n': n} for n in range(2500)]
+        cache = sources._RowCache(self.cache_dir, 2**30)
+        writers = [cache.record(self.filename, (), 'states', iter(rows))
+                   for _ in range(2)]
+        self.assertEqual([pair for pair in zip(*writers)], [(r, r) for r in rows])
+        for writer in writers:
+            self.assertEqual(list(writer), [])  # each stores its rows
+        (table_name, cached) = cache.replay(self.filename, ())
+        self.assertEqual(list(cached), rows)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
 
 class Testdata_dispenser(unittest.TestCase):
 
@@ -144,7 +967,7 @@ class Testdata_dispenser(unittest.TestCase):
                 self.assertEqual(list(src)[0], expectation[0],
                              msg='%s, limiting to 1')
 
-            if ext == 'xls':
+            if ext in ('xls', 'xlsx'):
                 continue
 
             # now test against an open file object
@@ -154,7 +977,7 @@ class Testdata_dispenser(unittest.TestCase):
                                  msg="%s, by file obj" % filename)
 
             # now test against the text contents
-            if not filename.endswith('.pickle'):
+            if not filename.endswith(('.pickle', '.gz', '.bz2', '.xz', '.zip')):
                 with open(here(filename)) as infile:
                     src = sources.Source(infile.read(), fieldnames=fieldnames)
                     self.assertEqual(list(src), expectation,
@@ -172,6 +995,212 @@ class Testdata_dispenser(unittest.TestCase):
         self.assertEqual(list(src), expectation,
                          'glob on *.json. limit=1')
 
+    def test_batches(self):
+        src = sources.Source(here('animals.csv'))
+        batches = list(src.batches(2))
+        self.assertEqual(len(batches), 2)
+        self.assertIs(batches[0][0], batches[1][0])
+        self.assertEqual(batches[0][0], ('name', 'species', 'kg', 'notes'))
+        self.assertEqual(batches[1][1], [('Emily', 'salamander', '0.3', '')])
+        src = sources.Source(here('animals.csv'), limit=1)
+        self.assertEqual([len(rows) for (header, rows) in src.batches(2)], [1])
+        src = sources.Source(here('menu.json'))
+        self.assertEqual(list(src.batches(10)),
+                         [(('name', 'cost'), [('soup', 4.99),
+                                              ('sweet potatoes', 4.99)]),
+                          (('name', 'cost', 'warning'),
+                           [('nuts', 2.95, 'contains nuts')])])
+
+    def test_column_batches(self):
+        src = sources.Source(here('federal_budgets.xls'))
+        columns = next(src.column_batches(5))
+        self.assertEqual(list(columns.keys())[:2], ['Year', 'Receipts'])
+        self.assertEqual(list(columns['Receipts'][:2]), [1160.0, 14462.0])
+        self.assertEqual(len(columns['Year']), 5)
+
+    def test_client_side_selection(self):
+        src = sources.Source(here('animals.csv'), columns=['kg', 'name'],
+                             where={'species': 'polar bear'})
+        self.assertEqual(list(src), [OrderedDict([('kg', '312.7'),
+                                                  ('name', 'Gertrude')])])
+        src = sources.Source(here('*.json'), limit=1, columns=['name'])
+        self.assertEqual(list(src), [{'name': 'soup'}, {'name': 'Earth'}])
+
+    def test_row_types(self):
+        with open(here('animals.result')) as infile:
+            expectation = eval(infile.read())
+        for row_type in ('tuple', 'namedtuple', 'slots'):
+            rows = list(sources.Source(here('animals.csv'), row_type=row_type))
+            self.assertEqual([r._asdict() for r in rows], expectation)
+            self.assertIs(type(rows[0]), type(rows[-1]))
+            self.assertEqual(rows[1]['species'], 'polar bear')
+            self.assertEqual(list(rows[1].keys()), list(expectation[1].keys()))
+            self.assertEqual(rows[1].get('nonexistent', 'x'), 'x')
+            if row_type != 'namedtuple':  # which holds values, as tuples do
+                self.assertIn('species', rows[1])
+                self.assertNotIn('polar bear', rows[1])
+        row = list(sources.Source(here('animals.csv'), row_type='namedtuple'))[0]
+        self.assertEqual((row.name, row[0]), ('Alfred', 'Alfred'))
+        row = list(sources.Source(here('menu.json'), row_type='slots'))[2]
+        row['cost'] = 3.25
+        self.assertEqual(dict(row), {'name': 'nuts', 'warning': 'contains nuts',
+                                     'cost': 3.25})
+        self.assertRaises(ValueError, sources.Source, here('menu.json'),
+                          row_type='frozenset')
+
+    def test_compressed(self):
+        with open(here('all_json.result')) as infile:
+            expectation = eval(infile.read())
+        self.assertEqual(list(sources.Source(here('*.json.bz2'))),
+                         expectation[3:])
+        with open(here('animals.result')) as infile:
+            expectation = eval(infile.read())
+        with tempfile.TemporaryDirectory() as dir_name:
+            # recognized by its first bytes, without a suffix
+            filename = os.path.join(dir_name, 'animals')
+            with open(filename, 'wb') as outfile:
+                with open(here('animals.csv.gz'), 'rb') as infile:
+                    outfile.write(infile.read())
+            src = sources.Source(filename)
+            self.assertEqual(list(src), expectation)
+            self.assertEqual(src.table_name, 'animals')
+
+    def test_parallel_glob(self):
+        with open(here('all_json.result')) as infile:
+            expectation = eval(infile.read())
+        for pool in ('process', 'thread'):
+            src = sources.Source(here('*.json'), workers=2, pool=pool)
+            self.assertEqual(list(src), expectation,
+                             'parallel glob on *.json, %s pool' % pool)
+        src = sources.Source(here('*.json'), workers=2, ordered=False)
+        self.assertEqual(sorted(list(src), key=repr),
+                         sorted(expectation, key=repr),
+                         'unordered parallel glob on *.json')
+        with open(here('all_json_limit_1.result')) as infile:
+            expectation = eval(infile.read())
+        src = sources.Source(here('*.json'), limit=1, workers=2)
+        self.assertEqual(list(src), expectation,
+                         'parallel glob on *.json. limit=1')
+
+    def test_excel_sheets(self):
+        with open(here('federal_budgets.result')) as infile:
+            expectation = eval(infile.read())
+        for filename in ('federal_budgets.xls', 'federal_budgets.xlsx'):
+            for table in (0, 'Sheet1'):
+                src = sources.Source(here(filename), table=table)
+                self.assertEqual(src.table_name,
+                                 '%s-Sheet1' % here(filename))
+                self.assertEqual(list(src), expectation,
+                                 '%s, sheet %s' % (filename, table))
+            self.assertRaises(Exception, sources.Source, here(filename),
+                              table='Sheet2')
+
+    def test_xlsx_closed(self):
+        for (kwargs, read) in (({}, 0), ({'limit': 1}, 2), ({}, 2)):
+            src = sources.Source(here('federal_budgets.xlsx'), **kwargs)
+            workbook = src.subsources[-1].generator.unload.__self__
+            list(itertools.islice(src, read))
+            src.close()
+            self.assertIsNone(workbook._archive.fp, msg=(kwargs, read))
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'lists open files')
+    def test_xls_closed(self):
+        path = os.path.realpath(here('federal_budgets.xls'))
+        def is_open():
+            fds = os.listdir('/proc/self/fd')
+            return path in (os.path.realpath(os.path.join('/proc/self/fd', fd))
+                            for fd in fds)
+        for (kwargs, read) in (({}, 0), ({'limit': 1}, 2), ({}, None),
+                               ({'table': 0}, None)):
+            src = sources.Source(path, **kwargs)
+            list(itertools.islice(src, read))
+            src.close()
+            self.assertFalse(is_open(), msg=(kwargs, read))
+
+    def test_html_tables(self):
+        page = """<html><body>
+        <table id="empty"></table>
+        <table class="layout"><tr><td>menu</td></tr></table>
+        <div><table id="animals" class="data wide">
+          <thead><tr><th>name</th><th>legs</th></tr></thead>
+          <tbody><tr><td>dog</td><td>4</td></tr>
+                 <tr><td>bird<table><tr><td>!</td></tr></table></td>
+                     <td>2</td></tr></tbody>
+        </table></div>
+        <table><tr><td>a</td><td></td></tr><tr><td>1<td>2</tr></table>
+        </body></html>"""
+        animals = [OrderedDict([('name', 'dog'), ('legs', '4')]),
+                   OrderedDict([('name', 'bird!'), ('legs', '2')])]
+        for table in ('*', 2, '2', '#animals', '.data', 'table.wide',
+                      'div > table'):
+            src = sources.Source(io.StringIO(page), table=table)
+            self.assertEqual(list(src), animals, 'table=%s' % table)
+        src = sources.Source(io.StringIO(page), table=4)
+        self.assertEqual(list(src), [OrderedDict([('a', '1'), ('Field2', '2')])])
+        self.assertRaises(sources.ParseException, list,
+                          sources._html_to_odicts(page, table='#missing'))
+
+        # a selected table's rows come as they are parsed
+        chunk_size = sources._HTMLTableReader.chunk_size
+        sources._HTMLTableReader.chunk_size = 100
+        try:
+            with open(here('cities_of_ohio.html')) as infile:
+                src = sources.Source(infile, table='.wikitable')
+                self.assertEqual(next(src)['City'], 'Akron')
+                self.assertLess(infile.tell(), os.path.getsize(infile.name) / 2)
+        finally:
+            sources._HTMLTableReader.chunk_size = chunk_size
+
+    def test_parallel_csv(self):
+        for (filename, fieldnames) in (('naics_codes.csv', None),
+                                       ('naics_codes#headers#3.csv', 3),
+                                       ('animals.csv', 0),
+                                       ('animals.csv', ['name', 'legs'])):
+            expectation = list(sources.Source(here(filename),
+                                              fieldnames=fieldnames))
+            src = sources.Source(here(filename), fieldnames=fieldnames,
+                                 workers=2)
+            self.assertEqual(list(src), expectation,
+                             'parallel read of %s' % filename)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'quoted.csv')
+            with open(path, 'w') as outfile:
+                outfile.write('id,note\n')
+                for i in range(500):
+                    outfile.write('%d,"line one\nline ""%d"", two"\n' % (i, i))
+            chunk_bytes = sources._ParallelCSVReader.chunk_bytes
+            sources._ParallelCSVReader.chunk_bytes = 100
+            try:
+                for pool in ('process', 'thread'):
+                    src = sources.Source(path, workers=2, pool=pool)
+                    self.assertEqual(list(src), list(sources.Source(path)),
+                                     'quoted newlines, %s pool' % pool)
+                src = sources.Source(path, workers=2, limit=3)
+                self.assertEqual([r['id'] for r in src], ['0', '1', '2'])
+            finally:
+                sources._ParallelCSVReader.chunk_bytes = chunk_bytes
+
+    def test_empty_csv(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'empty.csv')
+            open(path, 'w').close()
+            for kwargs in ({}, {'workers': 2}, {'checkpoints': True},
+                           {'index': True}, {'shard': (1, 2)}):
+                self.assertEqual(list(sources.Source(path, **kwargs)), [],
+                                 msg=kwargs)
+
+    def test_parallel_csv_line_endings(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'cr.csv')
+            for newline in ('\r', '\r\n'):
+                with open(path, 'w', newline='') as outfile:
+                    outfile.write(newline.join(['name,legs', 'dog,4',
+                                                '"bird\rfish",2', 'ant,6', '']))
+                expectation = list(sources.Source(path))
+                self.assertEqual(len(expectation), 3)
+                src = sources.Source(path, workers=2, pool='thread')
+                self.assertEqual(list(src), expectation, repr(newline))
+
     def tearDown(self):
         pass
 